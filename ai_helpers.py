@@ -1,18 +1,12 @@
-import json
-import os
-import requests
-from textblob import TextBlob
-
-# Load environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
-
-# File paths
-CHAT_HISTORY_FILE = "chat_history.json"
+import yaml
+from spell_corrector import correct_text
+from chat_store import DEFAULT_CONVERSATION_ID, load_chat_history, append_chat_turn
+from llm_client import LLMError
+from llm_router import route
 
 # ✅ Correct spelling & grammar before processing
 def correct_spelling(user_input):
-    corrected_text = str(TextBlob(user_input).correct())
+    corrected_text = correct_text(user_input)
     return corrected_text
 
 # ✅ Detect frustration in user input
@@ -24,20 +18,6 @@ def detect_user_mood(user_input):
             return "frustrated"
     return "neutral"
 
-# ✅ Load chat history (keep last 10)
-def load_chat_history():
-    if not os.path.exists(CHAT_HISTORY_FILE):
-        return []
-    with open(CHAT_HISTORY_FILE, "r") as f:
-        history = json.load(f)
-    return history[-10:]
-
-# ✅ Save chat history
-def save_chat_history(history):
-    with open(CHAT_HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=4)
-
-
 # ✅ Guide user back on track if they go off-topic
 def enforce_focus(user_input, current_step):
     """Reaffirm the user's goal in the workflow."""
@@ -55,14 +35,14 @@ def load_ai_prompt():
     return config["ai_prompt"]["general"]
 
 
-def get_llm_response(user_input):
+async def get_llm_response(user_input, conversation_id=DEFAULT_CONVERSATION_ID):
     """Send user message to Google Gemini API and return AI response with improved conversation handling."""
     
     # ✅ Load AI instructions dynamically
     ai_instructions = load_ai_prompt()
 
     # ✅ Load last 10 chat messages for context
-    chat_history = load_chat_history()
+    chat_history = await load_chat_history(conversation_id)
 
     # ✅ Format chat history for LLM
     formatted_history = "\n".join(
@@ -85,21 +65,13 @@ def get_llm_response(user_input):
     AI:
     """
 
-    payload = {
-        "contents": [{"parts": [{"text": full_prompt}]}]
-    }
-    headers = {"Content-Type": "application/json"}
-
-    response = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=payload, headers=headers)
-
-    if response.status_code == 200:
-        response_data = response.json()
-        ai_response = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "No response received")
-
-        # ✅ Save chat history to prevent looping
-        chat_history.append({"user": user_input, "bot": ai_response})
-        save_chat_history(chat_history)
+    try:
+        ai_response = await route(full_prompt, preferred="gemini")
+    except LLMError as e:
+        print(f"❌ {str(e)}")
+        return "Error retrieving response from AI"
 
-        return ai_response
+    # ✅ Save chat history to prevent looping
+    await append_chat_turn(conversation_id, {"user": user_input, "bot": ai_response})
 
-    return "Error retrieving response from AI"
\ No newline at end of file
+    return ai_response
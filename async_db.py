@@ -0,0 +1,257 @@
+import asyncio
+import copy
+import os
+import asyncpg
+from contextlib import asynccontextmanager
+from ttl_cache import TTLCache
+from db import DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT_SECONDS
+
+# ✅ Async user and profile queries, used by the request handlers so database
+#    round trips never block the event loop. Schema setup and seeding stay in
+#    db.py and run once at startup.
+
+# Idle connections older than this are recycled by asyncpg
+ASYNC_DB_MAX_INACTIVE_SECONDS = 300
+
+# ✅ In-process cache for the per-request user/profile lookups. Writes through this
+#    module invalidate it; other workers converge within the TTL.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+_pool = None
+_pool_lock = None
+
+_users_by_email = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+_profiles_by_id = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+# Bumped before and after every profile write; a read only fills the cache if the
+# generation it started under is still current, so a row read before a write commits
+# can never be cached after that write's invalidation.
+_profile_generations = {}
+
+# ✅ Columns of `user_profiles` exposed in the profile dict (everything except id/user_id)
+PROFILE_COLUMNS = (
+    "age", "weekly_mileage", "race_type", "best_time", "best_time_date",
+    "last_time", "last_time_date", "target_race", "target_time", "last_check_in",
+)
+
+# ✅ Whole composite profile in one round trip: profile row via LEFT JOIN, child lists via array_agg
+USER_PROFILE_QUERY = f"""
+SELECT
+    u.id, u.name, u.email,
+    p.id AS profile_id,
+    {", ".join(f"p.{column}" for column in PROFILE_COLUMNS)},
+    COALESCE(
+        (SELECT array_agg(i.description ORDER BY i.id) FROM injury_history i WHERE i.user_id = u.id),
+        ARRAY[]::varchar[]
+    ) AS injury_history,
+    COALESCE(
+        (SELECT array_agg(n.description ORDER BY n.id) FROM nutrition_info n WHERE n.user_id = u.id),
+        ARRAY[]::varchar[]
+    ) AS nutrition
+FROM users u
+LEFT JOIN user_profiles p ON p.user_id = u.id
+WHERE u.id = $1
+"""
+
+# ✅ Current child-table contents for a user, both lists in one round trip
+CHILD_LISTS_QUERY = """
+SELECT
+    COALESCE(
+        (SELECT array_agg(description ORDER BY id) FROM injury_history WHERE user_id = $1),
+        ARRAY[]::varchar[]
+    ) AS injury_history,
+    COALESCE(
+        (SELECT array_agg(description ORDER BY id) FROM nutrition_info WHERE user_id = $1),
+        ARRAY[]::varchar[]
+    ) AS nutrition
+"""
+
+async def init_async_db_pool():
+    """Create the asyncpg pool if it does not exist yet."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = await asyncpg.create_pool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_inactive_connection_lifetime=ASYNC_DB_MAX_INACTIVE_SECONDS,
+                )
+                print(f"✅ Async database pool ready (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+            except Exception as e:
+                print(f"❌ Async database pool initialization error: {str(e)}")
+                raise
+    return _pool
+
+async def close_async_db_pool():
+    """Close the asyncpg pool; called from the FastAPI shutdown hook."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        print("✅ Async database pool closed")
+
+@asynccontextmanager
+async def acquire():
+    """Check out a pooled connection, creating the pool lazily on first use."""
+    pool = _pool or await init_async_db_pool()
+    async with pool.acquire(timeout=DB_POOL_TIMEOUT_SECONDS) as conn:
+        yield conn
+
+def cache_stats():
+    """Hit/miss counters for the user and profile caches."""
+    return {
+        "users_by_email": _users_by_email.stats(),
+        "profiles_by_id": _profiles_by_id.stats(),
+    }
+
+async def get_user_by_email(email):
+    """Get a user by email (cached)."""
+    cached = _users_by_email.get(email)
+    if cached is not None:
+        return dict(cached)
+    try:
+        async with acquire() as conn:
+            user = await conn.fetchrow(
+                "SELECT id, email, password FROM users WHERE email = $1",
+                email
+            )
+            if not user:
+                return None
+            user = dict(user)
+            _users_by_email.set(email, user)
+            return dict(user)
+    except Exception as e:
+        print(f"❌ Error getting user: {str(e)}")
+        return None
+
+async def create_user(name, email, password):
+    """Create a new user."""
+    _users_by_email.pop(email)
+    try:
+        async with acquire() as conn:
+            return await conn.fetchval(
+                "INSERT INTO users (name, email, password) VALUES ($1, $2, $3) RETURNING id",
+                name, email, password
+            )
+    except asyncpg.exceptions.UniqueViolationError:
+        # Handle duplicate email
+        return None
+    except Exception as e:
+        print(f"❌ Error creating user: {str(e)}")
+        return None
+
+def profile_from_row(row):
+    """Shape a `USER_PROFILE_QUERY` row into the profile dict returned by `get_user_profile`."""
+    result = {
+        "id": row['id'],
+        "name": row['name'],
+        "email": row['email'],
+        "injury_history": list(row['injury_history']),
+        "nutrition": list(row['nutrition'])
+    }
+
+    # Add profile data if it exists
+    if row['profile_id'] is not None:
+        for column in PROFILE_COLUMNS:
+            result[column] = row[column]
+
+    return result
+
+async def get_user_profile(user_id):
+    """Get a user profile with all related data in a single query (cached)."""
+    cached = _profiles_by_id.get(user_id)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    generation = _profile_generations.get(user_id, 0)
+    try:
+        async with acquire() as conn:
+            row = await conn.fetchrow(USER_PROFILE_QUERY, user_id)
+            if not row:
+                return None
+            profile = profile_from_row(row)
+            if _profile_generations.get(user_id, 0) == generation:
+                _profiles_by_id.set(user_id, profile)
+            return copy.deepcopy(profile)
+    except Exception as e:
+        print(f"❌ Error getting user profile: {str(e)}")
+        return None
+
+def upsert_profile_query(columns):
+    """Build an INSERT ... ON CONFLICT statement that creates or updates the profile row."""
+    if not columns:
+        return "INSERT INTO user_profiles (user_id) VALUES ($1) ON CONFLICT (user_id) DO NOTHING"
+    return (
+        f"INSERT INTO user_profiles (user_id, {', '.join(columns)}) "
+        f"VALUES ({', '.join(f'${n}' for n in range(1, len(columns) + 2))}) "
+        f"ON CONFLICT (user_id) DO UPDATE SET {', '.join(f'{column} = EXCLUDED.{column}' for column in columns)}"
+    )
+
+async def sync_child_rows(conn, table, user_id, current_items, new_items):
+    """Bring a child table in line with `new_items`, writing nothing if it is unchanged.
+
+    Pure appends only insert the new tail; any other change replaces the user's rows
+    with a single multi-row INSERT.
+    """
+    current_items = list(current_items)
+    new_items = list(new_items)
+    if current_items == new_items:
+        return
+
+    if new_items[:len(current_items)] == current_items:
+        rows = new_items[len(current_items):]
+    else:
+        await conn.execute(f"DELETE FROM {table} WHERE user_id = $1", user_id)
+        rows = new_items
+
+    if rows:
+        await conn.execute(
+            f"INSERT INTO {table} (user_id, description) SELECT $1, unnest($2::varchar[])",
+            user_id, rows
+        )
+
+def _invalidate_profile(user_id):
+    _profile_generations[user_id] = _profile_generations.get(user_id, 0) + 1
+    _profiles_by_id.pop(user_id)
+
+async def save_user_profile(user_id, profile_data):
+    """Save or update a user profile, touching child tables only when their contents changed."""
+    _invalidate_profile(user_id)
+    try:
+        async with acquire() as conn:
+            async with conn.transaction():
+                # Extract lists for separate tables
+                injury_history = profile_data.pop('injury_history', [])
+                nutrition = profile_data.pop('nutrition', [])
+
+                # `name` lives on the users table
+                name = profile_data.pop('name', None)
+                if name is not None:
+                    await conn.execute(
+                        "UPDATE users SET name = $1 WHERE id = $2 AND name IS DISTINCT FROM $1",
+                        name, user_id
+                    )
+
+                # Create or update the profile row in one statement
+                columns = [key for key in profile_data.keys() if key in PROFILE_COLUMNS]
+                await conn.execute(
+                    upsert_profile_query(columns),
+                    user_id, *[profile_data[column] for column in columns]
+                )
+
+                # Diff child tables against what is stored
+                current = await conn.fetchrow(CHILD_LISTS_QUERY, user_id)
+                await sync_child_rows(conn, "injury_history", user_id, current['injury_history'], injury_history)
+                await sync_child_rows(conn, "nutrition_info", user_id, current['nutrition'], nutrition)
+
+                return True
+    except Exception as e:
+        print(f"❌ Error saving user profile: {str(e)}")
+        return False
+    finally:
+        _invalidate_profile(user_id)
@@ -0,0 +1,132 @@
+import argparse
+import time
+import numpy as np
+import faiss_helper
+from index_builder import build_index, load_flat_embeddings
+
+# ✅ Recall / latency / memory of each index mode against the exact flat baseline.
+#
+#    python benchmark_index.py --sizes 10000,100000,1000000
+#    python benchmark_index.py --real        # the vectors in knowledge_index.faiss
+#
+#    Synthetic corpora are clustered, L2-normalized vectors shaped like MiniLM embeddings,
+#    so IVF/PQ training sees realistic structure. Queries are searched one at a time,
+#    matching how /chat issues them.
+
+
+def synthetic_embeddings(n, dimension, rng, clusters=None):
+    clusters = clusters or max(8, int(np.sqrt(n)))
+    centers = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dimension), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(corpus, count, rng):
+    """Perturbed corpus rows: close to real data without being exact duplicates."""
+    rows = corpus[rng.integers(0, len(corpus), count)]
+    queries = rows + 0.1 * rng.standard_normal(rows.shape, dtype=np.float32)
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+def index_memory_bytes(index):
+    import faiss
+
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def time_queries(index, queries, k):
+    latencies = np.empty(len(queries))
+    labels = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, labels[i] = index.search(query[None, :], k)
+        latencies[i] = time.perf_counter() - started
+    return labels, latencies
+
+
+def recall_at_k(labels, ground_truth):
+    hits = sum(len(set(row[row >= 0]) & set(truth)) for row, truth in zip(labels, ground_truth))
+    return hits / ground_truth.size
+
+
+def search_settings(index, nprobes, ef_searches):
+    """(label, apply) pairs sweeping the search-time knob of `index`."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return [(f"nprobe={n}", lambda n=n: setattr(ivf, "nprobe", min(n, ivf.nlist))) for n in nprobes]
+    if isinstance(index, faiss.IndexHNSW):
+        return [(f"efSearch={ef}", lambda ef=ef: setattr(index.hnsw, "efSearch", ef)) for ef in ef_searches]
+    return [("exact", lambda: None)]
+
+
+def benchmark(corpus, queries, modes, k, nprobes, ef_searches):
+    """One result row per (mode, search setting)."""
+    flat = build_index(corpus, "flat")
+    ground_truth, _ = time_queries(flat, queries, k)
+
+    rows = []
+    for mode in modes:
+        started = time.perf_counter()
+        index = flat if mode == "flat" else build_index(corpus, mode)
+        build_seconds = time.perf_counter() - started
+        memory_bytes = index_memory_bytes(index)
+
+        for setting, apply in search_settings(index, nprobes, ef_searches):
+            apply()
+            labels, latencies = time_queries(index, queries, k)
+            rows.append({
+                "n": len(corpus),
+                "mode": mode,
+                "setting": setting,
+                f"recall@{k}": round(recall_at_k(labels, ground_truth), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+                "memory_mb": round(memory_bytes / 2**20, 2),
+                "build_s": round(build_seconds, 2),
+            })
+    return rows
+
+
+def print_table(rows):
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+# ✅ CLI
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare FAISS index modes: recall@k vs flat, latency and memory.")
+    parser.add_argument("--sizes", type=parse_ints, default=[10_000, 100_000], help="synthetic corpus sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--real", action="store_true", help="benchmark the vectors in the flat knowledge index instead")
+    parser.add_argument("--modes", default=",".join(faiss_helper.INDEX_MODES))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--nprobe", type=parse_ints, default=[4, faiss_helper.FAISS_NPROBE, 64])
+    parser.add_argument("--ef-search", type=parse_ints, default=[16, faiss_helper.FAISS_EF_SEARCH, 256])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    modes = [m for m in args.modes.split(",") if m]
+    corpora = [load_flat_embeddings()] if args.real else (
+        synthetic_embeddings(n, args.dimension, rng) for n in args.sizes
+    )
+
+    results = []
+    for corpus in corpora:
+        print(f"🔍 Benchmarking {len(corpus)} vectors...")
+        k = min(args.k, len(corpus))
+        results.extend(benchmark(corpus, make_queries(corpus, args.queries, rng), modes, k, args.nprobe, args.ef_search))
+    print_table(results)
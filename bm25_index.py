@@ -0,0 +1,208 @@
+import json
+import os
+import re
+import numpy as np
+
+# ✅ BM25 inverted index in CSR form: for term t, rows doc_ids[offsets[t]:offsets[t + 1]]
+#    hold the documents containing t and `weights` their saturated, length-normalized tf.
+#    idf is applied at query time from document frequencies summed over all segments, so
+#    ingestion can append a segment for its new rows without touching the existing ones.
+#    A query is a handful of numpy slices and adds.
+BM25_DIR = "bm25"                    # inside the knowledge store directory (and each of its segments)
+BM25_FORMAT = 2                      # 1 stored idf-weighted impacts
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Latency bounds: at most this many distinct query terms, and terms found in more than
+# this share of documents are skipped (near-zero idf, longest posting lists)
+BM25_MAX_QUERY_TERMS = int(os.getenv("BM25_MAX_QUERY_TERMS", "16"))
+BM25_MAX_DOC_FRACTION = float(os.getenv("BM25_MAX_DOC_FRACTION", "0.5"))
+
+OFFSETS_FILE = "offsets.npy"
+DOC_IDS_FILE = "doc_ids.npy"
+WEIGHTS_FILE = "weights.npy"
+VOCAB_FILE = "vocab.json"            # written last, acts as the commit marker
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from how i if in into is it its my of on or so "
+    "that the their them then there these they this to was we what when where which who why "
+    "will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens without stopwords; plural 's' is dropped ("hamstrings" -> "hamstring")."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Segment:
+    """Postings for a contiguous range of documents; doc ids are local to the segment."""
+
+    def __init__(self, vocab, offsets, doc_ids, weights, doc_count):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.doc_count = doc_count
+
+    @classmethod
+    def build(cls, texts, k1=BM25_K1, b=BM25_B):
+        """Index `texts` (any sequence of strings); document ids are their positions."""
+        vocab = {}
+        postings = []  # per term: list of (doc_id, tf)
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id in range(len(texts)):
+            counts = {}
+            tokens = tokenize(texts[doc_id])
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term_id = vocab.setdefault(token, len(vocab))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, tf))
+
+        avg_length = float(doc_lengths.mean()) if len(texts) else 0.0
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in postings], out=offsets[1:])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        weights = np.empty(offsets[-1], dtype=np.float32)
+
+        for term_id, term_postings in enumerate(postings):
+            start, end = offsets[term_id], offsets[term_id + 1]
+            ids = np.fromiter((d for d, _ in term_postings), dtype=np.int32, count=end - start)
+            tf = np.fromiter((t for _, t in term_postings), dtype=np.float32, count=end - start)
+            norm = k1 * (1.0 - b + b * doc_lengths[ids] / max(avg_length, 1e-9))
+            doc_ids[start:end] = ids
+            weights[start:end] = tf * (k1 + 1.0) / (tf + norm)
+
+        return cls(vocab, offsets, doc_ids, weights, len(texts))
+
+    @classmethod
+    def open(cls, directory):
+        """Memory-map an index written by `write`."""
+        with open(os.path.join(directory, VOCAB_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != BM25_FORMAT:
+            raise RuntimeError(f"{directory} was written by an older version; rebuild it with `python knowledge_store.py`")
+        return cls(
+            meta["vocab"],
+            np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, DOC_IDS_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, WEIGHTS_FILE), mmap_mode="r"),
+            meta["doc_count"],
+        )
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        vocab_path = os.path.join(directory, VOCAB_FILE)
+        if os.path.exists(vocab_path):
+            os.remove(vocab_path)
+
+        def replace(name, write):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        replace(OFFSETS_FILE, lambda f: np.save(f, np.asarray(self.offsets)))
+        replace(DOC_IDS_FILE, lambda f: np.save(f, np.asarray(self.doc_ids)))
+        replace(WEIGHTS_FILE, lambda f: np.save(f, np.asarray(self.weights)))
+        replace(VOCAB_FILE, lambda f: f.write(json.dumps({
+            "format": BM25_FORMAT,
+            "doc_count": self.doc_count,
+            "vocab": self.vocab,
+        }).encode("utf-8")))
+
+    def postings(self, term_id):
+        return slice(self.offsets[term_id], self.offsets[term_id + 1])
+
+
+class BM25Index:
+    """BM25 over one or more segments, searched as a single index over global row ids."""
+
+    def __init__(self, segments):
+        self.segments = segments  # [(first row id, BM25Segment)], contiguous and ascending
+        self.doc_count = sum(segment.doc_count for _, segment in segments)
+
+    @classmethod
+    def build(cls, texts, k1=BM25_K1, b=BM25_B):
+        return cls([(0, BM25Segment.build(texts, k1, b))])
+
+    @classmethod
+    def open(cls, store_directory):
+        """Memory-map the base index of a knowledge store and the indexes of its segments."""
+        return cls([(0, BM25Segment.open(os.path.join(store_directory, BM25_DIR)))]).with_new_segments(store_directory)
+
+    def with_new_segments(self, store_directory):
+        """This index extended by the store's segments that start at or after its last document."""
+        from knowledge_store import segment_dir, segment_starts
+
+        segments = list(self.segments)
+        doc_count = self.doc_count
+        for start in segment_starts(store_directory):
+            if start < doc_count:
+                continue
+            if start > doc_count:
+                raise RuntimeError(f"BM25 segment {start} in {store_directory} leaves a gap after document {doc_count}")
+            segment = BM25Segment.open(os.path.join(segment_dir(store_directory, start), BM25_DIR))
+            segments.append((start, segment))
+            doc_count += segment.doc_count
+        return BM25Index(segments)
+
+    def search(self, query, top_k, allowed=None):
+        """Top `top_k` (doc_ids, scores) for `query`, best first; `allowed` is an optional boolean row mask."""
+        terms = []  # (idf, [(first row id, segment, term_id)])
+        for token in dict.fromkeys(tokenize(query)):
+            hits = [(start, segment, segment.vocab[token]) for start, segment in self.segments if token in segment.vocab]
+            if not hits:
+                continue
+            df = sum(segment.offsets[t + 1] - segment.offsets[t] for _, segment, t in hits)
+            if df > BM25_MAX_DOC_FRACTION * self.doc_count:
+                continue
+            terms.append((np.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5)), hits))
+            if len(terms) == BM25_MAX_QUERY_TERMS:
+                break
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Sum impacts per document over the matched posting lists only (no O(N) score array)
+        matched = []
+        impacts = []
+        for idf, hits in terms:
+            for start, segment, term_id in hits:
+                postings = segment.postings(term_id)
+                matched.append(segment.doc_ids[postings].astype(np.int64) + start)
+                impacts.append(segment.weights[postings] * np.float32(idf))
+        doc_ids, inverse = np.unique(np.concatenate(matched), return_inverse=True)
+        doc_scores = np.bincount(inverse, weights=np.concatenate(impacts)).astype(np.float32)
+        if allowed is not None:
+            keep = allowed[doc_ids]
+            doc_ids, doc_scores = doc_ids[keep], doc_scores[keep]
+        if len(doc_ids) > top_k:
+            best = np.argpartition(-doc_scores, top_k)[:top_k]
+            doc_ids, doc_scores = doc_ids[best], doc_scores[best]
+        order = np.argsort(-doc_scores, kind="stable")
+        return doc_ids[order], doc_scores[order]
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=60):
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank). Returns the top `top_k` ids."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            if doc_id < 0:
+                continue
+            scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:top_k]
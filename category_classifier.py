@@ -0,0 +1,107 @@
+import os
+import re
+import threading
+import numpy as np
+import faiss_helper
+
+# ✅ Local message categorizer: nearest centroid over the MiniLM sentence embeddings.
+#
+#    Each knowledge row is labelled from its `topic_path` (e.g. "nutrition > pre_race_diet"
+#    -> Nutrition), and the rows' FAISS vectors are averaged into one unit centroid per
+#    category. Classifying a message is then one cached query embedding and a 3 x 384 dot
+#    product, instead of an LLM round trip.
+CATEGORIES = ("Running", "Nutrition", "Mindset")
+DEFAULT_CATEGORY = "Running"
+
+# Keywords in a topic path (or, before retrieval has loaded, in the message itself). Each one
+# matches whole words starting with it, so stems like "hydrat" cover "hydration"/"hydrated"
+# while "eat" never matches inside "great".
+CATEGORY_KEYWORDS = {
+    "Nutrition": ("nutrition", "diet", "food", "insulin", "plant_based", "oil", "nitric_oxide",
+                  "eat", "meal", "carb", "protein", "hydrat", "fuel", "gel", "drink"),
+    "Mindset": ("mindset", "motivat", "goal", "holistic", "mental", "confiden", "nervous",
+                "anxi", "focus", "believ"),
+}
+RECONSTRUCT_BATCH = int(os.getenv("CATEGORY_RECONSTRUCT_BATCH", "65536"))  # rows read per step
+
+# Underscores separate words too, so "pre_race_diet" contains "diet"
+_KEYWORD_PATTERNS = {
+    category: re.compile(r"(?<![a-z0-9])(?:" + "|".join(map(re.escape, words)) + r")[a-z0-9]*")
+    for category, words in CATEGORY_KEYWORDS.items()
+}
+
+_build_lock = threading.Lock()
+_centroids = None        # float32[len(CATEGORIES), dim], unit rows
+_built_for = None        # knowledge store the centroids were trained from
+_stats_lock = threading.Lock()  # classify_message runs on threadpool threads
+category_stats = {"classified": 0, "fallback": 0, "builds": 0, **{category: 0 for category in CATEGORIES}}
+
+
+def _count(*keys):
+    with _stats_lock:
+        for key in keys:
+            category_stats[key] += 1
+
+def category_classifier_stats():
+    """Snapshot of the classifier counters for the `/metrics` endpoint."""
+    with _stats_lock:
+        return dict(category_stats)
+
+def keyword_category(text):
+    """Category whose keywords occur most often in `text`; None when nothing matches."""
+    text = text.lower()
+    counts = {category: len(pattern.findall(text)) for category, pattern in _KEYWORD_PATTERNS.items()}
+    best = max(counts, key=counts.get)
+    return best if counts[best] else None
+
+def topic_category(topic_path):
+    return keyword_category(re.sub(r"\s*>\s*", " ", topic_path)) or DEFAULT_CATEGORY
+
+def build_centroids(store):
+    """Per-category mean of the exact-index vectors, normalized. Categories with no rows stay zero."""
+    import faiss
+
+    index = faiss_helper.load_flat_index(faiss.IO_FLAG_MMAP)
+    if index.ntotal != len(store):
+        raise RuntimeError(f"The exact index has {index.ntotal} rows but the knowledge store has {len(store)}")
+
+    topic_labels = np.array([CATEGORIES.index(topic_category(name)) for name in store.topic_names], dtype=np.int64)
+    labels = topic_labels[np.asarray(store.topic_ids)]
+    sums = np.zeros((len(CATEGORIES), index.d), dtype=np.float64)
+    for start in range(0, index.ntotal, RECONSTRUCT_BATCH):
+        vectors = index.reconstruct_n(start, min(RECONSTRUCT_BATCH, index.ntotal - start))
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        np.add.at(sums, labels[start:start + len(vectors)], vectors)
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    return (sums / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+def get_centroids():
+    """Centroids for the serving knowledge store, (re)built after load or reload; None until retrieval is ready."""
+    global _centroids, _built_for
+    if not faiss_helper.is_ready():
+        return None
+    _, store, _, _ = faiss_helper._snapshot()
+    if _built_for is store:
+        return _centroids
+    with _build_lock:
+        if _built_for is not store:
+            try:
+                _centroids = build_centroids(store)
+                _count("builds")
+            except Exception as e:
+                _centroids = None
+                print(f"⚠️ Category centroids unavailable, using keywords: {str(e)}")
+            _built_for = store
+    return _centroids
+
+def classify_message(text):
+    """Running, Nutrition or Mindset for a user message (blocking: may encode the query and build centroids)."""
+    centroids = get_centroids()
+    if centroids is None:
+        category = keyword_category(text) or DEFAULT_CATEGORY
+        _count("fallback", category)
+    else:
+        embedding = faiss_helper.encode_queries([text])[0]
+        category = CATEGORIES[int(np.argmax(centroids @ embedding))]
+        _count("classified", category)
+    return category
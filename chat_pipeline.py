@@ -0,0 +1,121 @@
+import asyncio
+import time
+from fastapi.concurrency import run_in_threadpool
+
+# ✅ Stage runner for the pre-LLM /chat work.
+#
+#    Each stage names the stages it needs; a stage starts as soon as those finish, so
+#    independent stages (DB lookups, history load, spelling) overlap. Timings are kept
+#    per request (for the Server-Timing header) and aggregated for /metrics.
+
+
+class Stage:
+    def __init__(self, name, func, deps=(), blocking=False):
+        """`func(results)` receives the results of finished stages by name.
+
+        Coroutine functions are awaited; plain functions run inline, or in the threadpool
+        when `blocking` (file IO, CPU-heavy work).
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.blocking = blocking
+
+
+class StageTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}  # name -> (start_ms, end_ms) relative to `started`
+
+    def record(self, name, start, end):
+        self.spans[name] = ((start - self.started) * 1000, (end - self.started) * 1000)
+
+    def durations(self):
+        return {name: end - start for name, (start, end) in self.spans.items()}
+
+    def critical_path(self, stages):
+        """Stage names on the longest dependency chain, ending at the stage that finished last."""
+        deps = {stage.name: stage.deps for stage in stages}
+        finished = [name for name in self.spans if name in deps]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda name: self.spans[name][1])]
+        while deps[path[-1]]:
+            path.append(max(deps[path[-1]], key=lambda name: self.spans[name][1]))
+        return path[::-1]
+
+    def server_timing(self):
+        """`Server-Timing` header value, e.g. `profile;dur=4.1, retrieval;dur=12.7`."""
+        return ", ".join(f"{name};dur={duration:.1f}" for name, duration in self.durations().items())
+
+
+async def run_stages(stages, timings=None):
+    """Run `stages` respecting their dependencies; returns (results by name, StageTimings).
+
+    The first stage to fail cancels the rest and its exception propagates.
+    """
+    timings = timings or StageTimings()
+    results = {}
+    tasks = {}
+
+    async def run(stage):
+        if stage.deps:
+            await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        start = time.perf_counter()
+        if asyncio.iscoroutinefunction(stage.func):
+            result = await stage.func(results)
+        elif stage.blocking:
+            result = await run_in_threadpool(stage.func, results)
+        else:
+            result = stage.func(results)
+        timings.record(stage.name, start, time.perf_counter())
+        results[stage.name] = result
+        return result
+
+    for stage in stages:
+        unknown = [dep for dep in stage.deps if dep not in tasks]
+        if unknown:
+            raise ValueError(f"Stage {stage.name!r} depends on {unknown}, which must be listed before it")
+        tasks[stage.name] = asyncio.ensure_future(run(stage))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return results, timings
+
+
+class PipelineStats:
+    """Per-stage latency counters across requests, plus how often each stage was on the critical path."""
+
+    def __init__(self):
+        self.requests = 0
+        self.stages = {}
+        self.critical = {}
+
+    def record(self, timings, stages):
+        self.requests += 1
+        for name, duration in timings.durations().items():
+            entry = self.stages.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += duration
+            entry["max_ms"] = max(entry["max_ms"], duration)
+        for name in timings.critical_path(stages):
+            self.critical[name] = self.critical.get(name, 0) + 1
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "stages": {
+                name: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "critical_path_share": round(self.critical.get(name, 0) / self.requests, 3),
+                }
+                for name, entry in self.stages.items()
+            },
+        }
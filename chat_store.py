@@ -0,0 +1,437 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
+from collections import deque
+from async_db import acquire
+
+# ✅ Per-conversation chat history. A conversation is keyed by the user's email;
+#    unauthenticated legacy routes share DEFAULT_CONVERSATION_ID, as they shared
+#    chat_history.json before.
+DEFAULT_CONVERSATION_ID = "global"
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "10"))  # turns fed back into prompts
+CHAT_STORE_BACKEND = os.getenv("CHAT_STORE_BACKEND", "postgres")  # "postgres" or "jsonl"
+
+# ✅ JSONL backend settings
+CHAT_LOG_DIR = os.getenv("CHAT_LOG_DIR", "chat_log")
+CHAT_LOG_LOCK_FILE = "writer.lock"  # inside CHAT_LOG_DIR; flocked by the one process that owns the log
+CHAT_LOG_SEGMENT_BYTES = int(os.getenv("CHAT_LOG_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+# Appends wait for one shared fsync issued this long after the first unsynced write
+CHAT_LOG_FSYNC_WINDOW_MS = float(os.getenv("CHAT_LOG_FSYNC_WINDOW_MS", "10"))
+# Consecutive failed fsyncs after which the error is raised to the waiting appends
+CHAT_LOG_FSYNC_MAX_ATTEMPTS = int(os.getenv("CHAT_LOG_FSYNC_MAX_ATTEMPTS", "3"))
+# Ring buffer per conversation; the default holds the summary fold window
+# (SUMMARY_TAIL_TURNS + SUMMARY_MAX_BATCH = 24) so folds never replay the log
+CHAT_LOG_TAIL_TURNS = int(os.getenv("CHAT_LOG_TAIL_TURNS", str(max(CHAT_HISTORY_TURNS, 32))))
+CHAT_LOG_RETAIN_TURNS = int(os.getenv("CHAT_LOG_RETAIN_TURNS", "200"))  # per conversation, kept by compaction
+CHAT_LOG_MAX_SEALED_SEGMENTS = int(os.getenv("CHAT_LOG_MAX_SEALED_SEGMENTS", "4"))
+CHAT_LOG_COMPACT_INTERVAL_SECONDS = float(os.getenv("CHAT_LOG_COMPACT_INTERVAL_SECONDS", "300"))
+
+
+class PostgresChatStore:
+    """One row per turn in `chat_messages` (schema in db.init_db).
+
+    Appends are single-row INSERTs, so concurrent writers never overwrite each other;
+    "last N turns" is an index range scan on (conversation_id, id).
+    """
+
+    async def append(self, conversation_id, entry):
+        async with acquire() as conn:
+            await conn.execute(
+                "INSERT INTO chat_messages (conversation_id, entry) VALUES ($1, $2::jsonb)",
+                conversation_id, json.dumps(entry)
+            )
+
+    async def recent(self, conversation_id, limit, offset=0):
+        """(seq, entry) pairs of the last `limit` turns before the newest `offset`, oldest first."""
+        async with acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT id, entry::text FROM chat_messages WHERE conversation_id = $1 "
+                "ORDER BY id DESC LIMIT $2 OFFSET $3",
+                conversation_id, limit, offset
+            )
+        return [(row[0], json.loads(row[1])) for row in reversed(rows)]
+
+    async def get_summary(self, conversation_id):
+        """(summary, seq of the last turn folded into it); ("", 0) if none yet."""
+        async with acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT summary, through_id FROM chat_summaries WHERE conversation_id = $1",
+                conversation_id
+            )
+        return (row[0], row[1]) if row else ("", 0)
+
+    async def set_summary(self, conversation_id, summary, through_seq):
+        # Never move a summary backwards if two workers fold the same conversation
+        async with acquire() as conn:
+            await conn.execute(
+                "INSERT INTO chat_summaries (conversation_id, summary, through_id) VALUES ($1, $2, $3) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET summary = EXCLUDED.summary, "
+                "through_id = EXCLUDED.through_id, updated_at = CURRENT_TIMESTAMP "
+                "WHERE chat_summaries.through_id < EXCLUDED.through_id",
+                conversation_id, summary, through_seq
+            )
+
+
+_SEGMENT_NAME = re.compile(r"^chat-(\d{8})\.jsonl$")
+
+
+class JsonlChatStore:
+    """Append-only JSON Lines log of turns, one record per line:
+
+        {"seq": 42, "conversation_id": "runner@example.com", "entry": {"user": "...", "bot": "..."}}
+        {"seq": 43, "conversation_id": "runner@example.com", "summary": "...", "through_seq": 40}
+
+    - Appends write one line to the active segment; concurrent appends share a single
+      fsync (group commit) issued CHAT_LOG_FSYNC_WINDOW_MS after the first of them. A failed
+      fsync is retried; after CHAT_LOG_FSYNC_MAX_ATTEMPTS in a row the appends see the error.
+    - Reads come from an in-memory ring buffer of the last CHAT_LOG_TAIL_TURNS turns per
+      conversation, rebuilt by replaying the log at startup. A window reaching past a full
+      buffer is read back from the log instead.
+    - Segments roll over at CHAT_LOG_SEGMENT_BYTES. Once more than CHAT_LOG_MAX_SEALED_SEGMENTS
+      are sealed, compaction merges them into one, keeping the last CHAT_LOG_RETAIN_TURNS
+      turns per conversation. Replay dedupes by `seq`, so a crash mid-compaction is harmless.
+    - Single writer: sequence numbers, the active segment and the ring buffers live in one
+      process, so `open` takes an exclusive flock on CHAT_LOG_LOCK_FILE and refuses to start
+      if another process holds it. Run one worker with this backend; use Postgres for more.
+    """
+
+    def __init__(self, directory=CHAT_LOG_DIR):
+        self.directory = directory
+        self._tails = {}      # conversation_id -> deque of (seq, entry)
+        self._summaries = {}  # conversation_id -> (summary, through_seq)
+        self._seq = 0
+        self._file = None
+        self._lock_file = None
+        self._sealed_files = []  # rotated-out segments awaiting their final fsync
+        self._segment_number = 0
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._sync_task = None
+        self._sync_failures = 0
+        self._compact_task = None
+        self.appends = 0
+        self.fsyncs = 0
+        self.fsync_errors = 0
+        self.compactions = 0
+
+    # ---- segments -------------------------------------------------------------------------
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"chat-{number:08d}.jsonl")
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _read_segment(self, number):
+        with open(self._segment_path(number), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn final line from a crash before fsync
+
+    def open(self):
+        """Replay the log into the ring buffers and open a fresh active segment."""
+        if self._file is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_writer()
+        records = {}
+        for number in self._segment_numbers():
+            for record in self._read_segment(number):
+                records[record["seq"]] = record
+        for seq in sorted(records):
+            self._apply(records[seq])
+        self._seq = max(records, default=0)
+        self._written_seq = self._synced_seq = self._seq
+
+        numbers = self._segment_numbers()
+        self._open_segment((numbers[-1] if numbers else 0) + 1)
+        print(f"✅ Chat log replayed: {len(records)} records, {len(self._tails)} conversations")
+
+    def _lock_writer(self):
+        if self._lock_file is not None:
+            return
+        lock_file = open(os.path.join(self.directory, CHAT_LOG_LOCK_FILE), "a+")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Chat log {self.directory} is open in another process; the jsonl chat store supports "
+                f"a single worker (set CHAT_STORE_BACKEND=postgres to run several)"
+            )
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+
+    def _open_segment(self, number):
+        self._segment_number = number
+        self._file = open(self._segment_path(number), "a", encoding="utf-8")
+
+    def _rotate(self):
+        # The sealed segment is fsynced (and closed) by the next group commit, off the event loop
+        self._file.flush()
+        self._sealed_files.append(self._file)
+        self._open_segment(self._segment_number + 1)
+
+    def _apply(self, record):
+        conversation_id = record["conversation_id"]
+        if "summary" in record:
+            if record["through_seq"] > self._summaries.get(conversation_id, ("", 0))[1]:
+                self._summaries[conversation_id] = (record["summary"], record["through_seq"])
+        else:
+            self._tail(conversation_id).append((record["seq"], record["entry"]))
+
+    def _tail(self, conversation_id):
+        tail = self._tails.get(conversation_id)
+        if tail is None:
+            tail = self._tails[conversation_id] = deque(maxlen=CHAT_LOG_TAIL_TURNS)
+        return tail
+
+    # ---- appends and group commit ---------------------------------------------------------
+    async def append(self, conversation_id, entry):
+        await self._write({"conversation_id": conversation_id, "entry": entry})
+
+    async def _write(self, record):
+        self.open()
+        self._seq += 1
+        seq = self._seq
+        record = {"seq": seq, **record}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._written_seq = seq
+        self._apply(record)
+        self.appends += 1
+        if self._file.tell() >= CHAT_LOG_SEGMENT_BYTES:
+            self._rotate()
+        await self._wait_synced(seq)
+
+    async def _wait_synced(self, seq):
+        while self._synced_seq < seq:
+            if self._sync_task is None or self._sync_task.done():
+                self._sync_task = asyncio.ensure_future(self._sync())
+            await asyncio.shield(self._sync_task)
+
+    @staticmethod
+    def _fsync_files(files):
+        for file in files:
+            os.fsync(file.fileno())
+
+    async def _sync(self):
+        await asyncio.sleep(CHAT_LOG_FSYNC_WINDOW_MS / 1000.0)  # let concurrent appends join this fsync
+        if self._file is None:
+            return  # closed (and synced) by close()
+        target = self._written_seq
+        sealed, self._sealed_files = self._sealed_files, []
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._fsync_files, sealed + [self._file])
+        except OSError as e:
+            self._sealed_files[:0] = sealed
+            self._sync_failures += 1
+            self.fsync_errors += 1
+            if self._sync_failures >= CHAT_LOG_FSYNC_MAX_ATTEMPTS:
+                self._sync_failures = 0
+                print(f"❌ Chat log fsync failed {CHAT_LOG_FSYNC_MAX_ATTEMPTS} times: {str(e)}")
+                raise
+            print(f"⚠️ Chat log fsync failed, retrying: {str(e)}")
+            return
+        for file in sealed:
+            file.close()
+        self._sync_failures = 0
+        self._synced_seq = max(self._synced_seq, target)
+        self.fsyncs += 1
+
+    def _replay_turns(self, conversation_id):
+        """Every (seq, entry) of one conversation still in the log, oldest first."""
+        for attempt in range(3):
+            turns = {}
+            try:
+                for number in self._segment_numbers():
+                    for record in self._read_segment(number):
+                        if record["conversation_id"] == conversation_id and "entry" in record:
+                            turns[record["seq"]] = record["entry"]
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                continue  # compaction removed a segment mid-read; the merged one now holds it
+            return sorted(turns.items())
+
+    async def recent(self, conversation_id, limit, offset=0):
+        """(seq, entry) pairs, as PostgresChatStore.recent."""
+        self.open()
+        tail = self._tails.get(conversation_id)
+        if tail is not None and len(tail) == tail.maxlen and offset + limit > len(tail):
+            # Older turns may have dropped out of the buffer: read the window from the log
+            newest = tail[-1][0]
+            turns = await asyncio.get_running_loop().run_in_executor(None, self._replay_turns, conversation_id)
+            tail = [turn for turn in turns if turn[0] <= newest]
+        else:
+            tail = list(tail or ())
+        end = len(tail) - offset
+        return tail[max(0, end - limit):max(0, end)]
+
+    async def get_summary(self, conversation_id):
+        self.open()
+        return self._summaries.get(conversation_id, ("", 0))
+
+    async def set_summary(self, conversation_id, summary, through_seq):
+        if through_seq > (await self.get_summary(conversation_id))[1]:
+            await self._write({"conversation_id": conversation_id, "summary": summary, "through_seq": through_seq})
+
+    # ---- compaction -----------------------------------------------------------------------
+    def compact(self):
+        """Merge sealed segments, keeping the newest CHAT_LOG_RETAIN_TURNS turns and the latest
+        summary per conversation.
+
+        Only sealed (immutable) segments are read, so this runs on a worker thread while
+        appends continue. The merged file reuses the newest sealed segment's number.
+        """
+        sealed = [number for number in self._segment_numbers() if number < self._segment_number]
+        if len(sealed) <= CHAT_LOG_MAX_SEALED_SEGMENTS:
+            return False
+
+        by_seq = {}
+        for number in sealed:
+            for record in self._read_segment(number):
+                by_seq[record["seq"]] = record
+
+        kept = {}
+        summaries = {}
+        for seq in sorted(by_seq):
+            record = by_seq[seq]
+            if "summary" in record:
+                summaries[record["conversation_id"]] = record
+                continue
+            turns = kept.get(record["conversation_id"])
+            if turns is None:
+                turns = kept[record["conversation_id"]] = deque(maxlen=CHAT_LOG_RETAIN_TURNS)
+            turns.append(record)
+        records = sorted(
+            [record for turns in kept.values() for record in turns] + list(summaries.values()),
+            key=lambda r: r["seq"],
+        )
+
+        target = self._segment_path(sealed[-1])
+        tmp_path = f"{target}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+        for number in sealed[:-1]:
+            os.remove(self._segment_path(number))
+        self.compactions += 1
+        print(f"✅ Compacted {len(sealed)} chat log segments into {os.path.basename(target)} ({len(records)} records)")
+        return True
+
+    async def _compact_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(CHAT_LOG_COMPACT_INTERVAL_SECONDS)
+            try:
+                await loop.run_in_executor(None, self.compact)
+            except Exception as e:
+                print(f"⚠️ Chat log compaction failed: {str(e)}")
+
+    def start(self):
+        self.open()
+        if self._compact_task is None:
+            self._compact_task = asyncio.get_running_loop().create_task(self._compact_loop())
+
+    async def close(self):
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            self._compact_task = None
+        if self._file is not None:
+            self._file.flush()
+            files, self._sealed_files = self._sealed_files + [self._file], []
+            self._file = None
+            await asyncio.get_running_loop().run_in_executor(None, self._fsync_files, files)
+            for file in files:
+                file.close()
+            self._synced_seq = self._written_seq
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self):
+        return {
+            "backend": "jsonl",
+            "appends": self.appends,
+            "fsyncs": self.fsyncs,
+            "fsync_errors": self.fsync_errors,
+            "appends_per_fsync": round(self.appends / self.fsyncs, 2) if self.fsyncs else 0.0,
+            "conversations": len(self._tails),
+            "active_segment": self._segment_number,
+            "compactions": self.compactions,
+        }
+
+
+_store = JsonlChatStore() if CHAT_STORE_BACKEND == "jsonl" else PostgresChatStore()
+
+def get_chat_store():
+    return _store
+
+def start_chat_store():
+    """Replay the JSONL log and start background compaction (no-op for Postgres)."""
+    if isinstance(_store, JsonlChatStore):
+        _store.start()
+
+async def close_chat_store():
+    if isinstance(_store, JsonlChatStore):
+        await _store.close()
+
+def chat_store_stats():
+    return _store.stats() if isinstance(_store, JsonlChatStore) else {"backend": CHAT_STORE_BACKEND}
+
+async def load_chat_history(conversation_id=DEFAULT_CONVERSATION_ID, limit=CHAT_HISTORY_TURNS):
+    """The last `limit` turns of a conversation, oldest first."""
+    try:
+        return [entry for _, entry in await get_chat_store().recent(conversation_id, limit)]
+    except Exception as e:
+        print(f"❌ Error loading chat history: {str(e)}")
+        return []
+
+async def load_conversation(conversation_id, limit=CHAT_HISTORY_TURNS):
+    """(summary, recent turns): the rolling summary plus the last turns not yet folded into it."""
+    try:
+        store = get_chat_store()
+        (summary, through_seq), turns = await asyncio.gather(
+            store.get_summary(conversation_id), store.recent(conversation_id, limit)
+        )
+        return summary, [entry for seq, entry in turns if seq > through_seq]
+    except Exception as e:
+        print(f"❌ Error loading chat history: {str(e)}")
+        return "", []
+
+async def append_chat_turn(conversation_id, entry):
+    """Append one turn (e.g. {"user": ..., "bot": ...}) to a conversation."""
+    try:
+        await get_chat_store().append(conversation_id, entry)
+    except Exception as e:
+        print(f"❌ Error saving chat turn: {str(e)}")
+
+
+# ✅ One-off import of the old shared file: `python chat_store.py chat_history.json`
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    async def import_legacy_history(path):
+        with open(path, "r") as f:
+            history = json.load(f)
+        for entry in history:
+            await append_chat_turn(DEFAULT_CONVERSATION_ID, entry)
+        print(f"✅ Imported {len(history)} turns from {path} into '{DEFAULT_CONVERSATION_ID}'")
+
+    asyncio.run(import_legacy_history(sys.argv[1] if len(sys.argv) > 1 else "chat_history.json"))
@@ -8,4 +8,9 @@ if not os.getenv("RENDER_EXTERNAL_HOSTNAME"):
 DATABASE_URL = os.getenv("DATABASE_URL")
 SECRET_KEY = "your_secret_key_here"
 
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
\ No newline at end of file
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Accounts allowed to change shared data (e.g. POST /knowledge/ingest), comma-separated.
+# Empty means nobody: ingestion is then CLI-only (`python ingest_knowledge.py`).
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
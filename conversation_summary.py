@@ -0,0 +1,67 @@
+import asyncio
+import os
+from chat_store import get_chat_store
+from llm_client import LLMError
+from llm_router import route
+from prompt_builder import format_turn
+
+# ✅ Rolling conversation summaries. After each response, turns that have scrolled out of
+#    the verbatim tail are folded into a stored per-conversation summary, so prompts carry
+#    "summary + last few turns" instead of the last 10 turns in full.
+SUMMARY_TAIL_TURNS = int(os.getenv("SUMMARY_TAIL_TURNS", "4"))  # newest turns never folded
+SUMMARY_MIN_BATCH = int(os.getenv("SUMMARY_MIN_BATCH", "2"))    # fold only once this many are pending
+SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "20"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "150"))
+SUMMARY_PROVIDER = os.getenv("SUMMARY_PROVIDER", "openai")
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running coach's notes about a conversation with a runner. "
+    "Merge the new turns into the existing notes. Keep goals, races, paces, injuries, "
+    "preferences and advice already given; drop small talk. Reply with the notes only, under 100 words."
+)
+
+_locks = {}
+_tasks = set()
+summary_stats = {"updates": 0, "turns_folded": 0, "errors": 0}
+
+
+async def update_summary(conversation_id):
+    """Fold turns older than the verbatim tail into the conversation's summary (one LLM call)."""
+    lock = _locks.setdefault(conversation_id, asyncio.Lock())
+    if lock.locked():
+        return  # A fold for this conversation is already running; it will pick these turns up next time
+    async with lock:
+        try:
+            store = get_chat_store()
+            summary, through_seq = await store.get_summary(conversation_id)
+            pending = [
+                (seq, entry)
+                for seq, entry in await store.recent(conversation_id, SUMMARY_MAX_BATCH, offset=SUMMARY_TAIL_TURNS)
+                if seq > through_seq
+            ]
+            if len(pending) < SUMMARY_MIN_BATCH:
+                return
+
+            new_turns = "\n".join(format_turn(entry) for _, entry in pending)
+            prompt = f"Existing notes:\n{summary or '(none)'}\n\nNew turns:\n{new_turns}\n\nUpdated notes:"
+            new_summary = await route(
+                prompt, preferred=SUMMARY_PROVIDER, system_prompt=SUMMARY_SYSTEM_PROMPT, max_tokens=SUMMARY_MAX_TOKENS
+            )
+            await store.set_summary(conversation_id, new_summary.strip(), pending[-1][0])
+            summary_stats["updates"] += 1
+            summary_stats["turns_folded"] += len(pending)
+        except LLMError as e:
+            summary_stats["errors"] += 1
+            print(f"⚠️ Conversation summary not updated: {str(e)}")
+        except Exception as e:
+            summary_stats["errors"] += 1
+            print(f"❌ Error updating conversation summary: {str(e)}")
+    if not lock.locked() and _locks.get(conversation_id) is lock:
+        del _locks[conversation_id]
+
+
+def schedule_summary_update(conversation_id):
+    """Run `update_summary` in the background; the response never waits for it."""
+    task = asyncio.get_running_loop().create_task(update_summary(conversation_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -1,28 +1,116 @@
 import os
+import threading
+import time
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from contextlib import contextmanager
 import json
 
 # Get database URL from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# ✅ Connection pool settings (override via environment)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+# Connections idle longer than this are pinged with `SELECT 1` before being handed out
+DB_POOL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE_SECONDS", "30"))
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_last_used = {}
+
+def init_db_pool():
+    """Create the process-wide connection pool if it does not exist yet."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            try:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DATABASE_URL, cursor_factory=RealDictCursor
+                )
+                # ThreadedConnectionPool raises when exhausted; the semaphore makes callers wait instead
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_SIZE)
+                print(f"✅ Database pool ready (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+            except Exception as e:
+                print(f"❌ Database pool initialization error: {str(e)}")
+                raise
+    return _pool
+
+def close_db_pool():
+    """Close every pooled connection; called from the FastAPI shutdown hook."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+            print("✅ Database pool closed")
+
+def _is_healthy(conn):
+    """Cheap liveness check: closed flag always, a `SELECT 1` ping only after long idle periods."""
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _checkout(pool):
+    """Take a healthy connection from the pool, discarding broken ones."""
+    for _ in range(DB_POOL_MAX_SIZE + 1):
+        conn = pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        _last_used.pop(id(conn), None)
+        pool.putconn(conn, close=True)
+    raise PoolError("No healthy database connection available")
+
+def _release(pool, conn):
+    """Return a connection to the pool, ending any transaction the caller left open."""
+    close = bool(conn.closed)
+    if not close and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            close = True
+    if close:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    try:
+        pool.putconn(conn, close=close)
+    except PoolError:
+        # Pool was closed while the connection was checked out
+        conn.close()
+
 @contextmanager
 def get_db_connection():
-    """Create a database connection and close it when done."""
+    """Check out a pooled database connection and return it to the pool when done."""
+    pool = _pool or init_db_pool()
+    slots = _pool_slots
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+        raise PoolError("Timed out waiting for a database connection")
     conn = None
     try:
-        # Connect to PostgreSQL
-        conn = psycopg2.connect(DATABASE_URL)
-        # Return dictionary-like results
-        conn.cursor_factory = RealDictCursor
+        conn = _checkout(pool)
         yield conn
     except Exception as e:
         print(f"❌ Database connection error: {str(e)}")
         raise
     finally:
         if conn is not None:
-            conn.close()
+            _release(pool, conn)
+        slots.release()
 
 def init_db():
     """Initialize the database schema."""
@@ -76,6 +164,28 @@ def init_db():
                     description VARCHAR(200) NOT NULL
                 );
                 """)
+
+                # Create chat_messages table (one row per turn; see chat_store.py)
+                cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id BIGSERIAL PRIMARY KEY,
+                    conversation_id VARCHAR(100) NOT NULL,
+                    entry JSONB NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE INDEX IF NOT EXISTS chat_messages_conversation_idx
+                    ON chat_messages (conversation_id, id);
+                """)
+
+                # Create chat_summaries table (rolling summary of turns up to through_id)
+                cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_summaries (
+                    conversation_id VARCHAR(100) PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    through_id BIGINT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                """)
                 
                 conn.commit()
                 print("✅ Database schema initialized")
@@ -156,132 +266,3 @@ def get_user_by_email(email):
     except Exception as e:
         print(f"❌ Error getting user: {str(e)}")
         return None
-
-def create_user(name, email, password):
-    """Create a new user."""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO users (name, email, password) VALUES (%s, %s, %s) RETURNING id",
-                    (name, email, password)
-                )
-                user_id = cursor.fetchone()['id']
-                conn.commit()
-                return user_id
-    except psycopg2.errors.UniqueViolation:
-        # Handle duplicate email
-        if 'conn' in locals() and conn:
-            conn.rollback()
-        return None
-    except Exception as e:
-        print(f"❌ Error creating user: {str(e)}")
-        if 'conn' in locals() and conn:
-            conn.rollback()
-        return None
-
-def get_user_profile(user_id):
-    """Get a user profile with all related data."""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                # Get user data
-                cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-                user = cursor.fetchone()
-                
-                if not user:
-                    return None
-                
-                # Get profile data
-                cursor.execute("SELECT * FROM user_profiles WHERE user_id = %s", (user_id,))
-                profile = cursor.fetchone()
-                
-                # Get injury history
-                cursor.execute("SELECT description FROM injury_history WHERE user_id = %s", (user_id,))
-                injuries = [row['description'] for row in cursor.fetchall()]
-                
-                # Get nutrition info
-                cursor.execute("SELECT description FROM nutrition_info WHERE user_id = %s", (user_id,))
-                nutrition = [row['description'] for row in cursor.fetchall()]
-                
-                # Combine all data
-                result = {
-                    "id": user['id'],
-                    "name": user['name'],
-                    "email": user['email'],
-                    "injury_history": injuries,
-                    "nutrition": nutrition
-                }
-                
-                # Add profile data if it exists
-                if profile:
-                    for key, value in profile.items():
-                        if key != 'id' and key != 'user_id':
-                            result[key] = value
-                
-                return result
-    except Exception as e:
-        print(f"❌ Error getting user profile: {str(e)}")
-        return None
-
-def save_user_profile(user_id, profile_data):
-    """Save or update a user profile."""
-    try:
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                # Extract lists for separate tables
-                injury_history = profile_data.pop('injury_history', [])
-                nutrition = profile_data.pop('nutrition', [])
-                
-                # Check if profile exists
-                cursor.execute("SELECT id FROM user_profiles WHERE user_id = %s", (user_id,))
-                profile_exists = cursor.fetchone()
-                
-                if profile_exists:
-                    # Update existing profile
-                    set_clauses = []
-                    values = []
-                    
-                    for key, value in profile_data.items():
-                        if key not in ['id', 'user_id']:
-                            set_clauses.append(f"{key} = %s")
-                            values.append(value)
-                    
-                    if set_clauses:
-                        query = f"UPDATE user_profiles SET {', '.join(set_clauses)} WHERE user_id = %s"
-                        values.append(user_id)
-                        cursor.execute(query, values)
-                else:
-                    # Create new profile
-                    columns = ['user_id'] + [k for k in profile_data.keys()]
-                    placeholders = ['%s'] * len(columns)
-                    values = [user_id] + [profile_data.get(k) for k in profile_data.keys()]
-                    
-                    query = f"INSERT INTO user_profiles ({', '.join(columns)}) VALUES ({', '.join(placeholders)})"
-                    cursor.execute(query, values)
-                
-                # Delete existing injury history and nutrition
-                cursor.execute("DELETE FROM injury_history WHERE user_id = %s", (user_id,))
-                cursor.execute("DELETE FROM nutrition_info WHERE user_id = %s", (user_id,))
-                
-                # Insert new injury history
-                for injury in injury_history:
-                    cursor.execute(
-                        "INSERT INTO injury_history (user_id, description) VALUES (%s, %s)",
-                        (user_id, injury)
-                    )
-                
-                # Insert new nutrition
-                for item in nutrition:
-                    cursor.execute(
-                        "INSERT INTO nutrition_info (user_id, description) VALUES (%s, %s)",
-                        (user_id, item)
-                    )
-                
-                conn.commit()
-                return True
-    except Exception as e:
-        print(f"❌ Error saving user profile: {str(e)}")
-        if 'conn' in locals() and conn:
-            conn.rollback()
-        return False
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os
+import re
+import numpy as np
+from ttl_cache import TTLCache
+
+# Rough per-entry overhead (key string, tuple, OrderedDict node) on top of the vector itself
+ENTRY_OVERHEAD_BYTES = 256
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(text):
+    """Canonical cache key for a query: lowercased, whitespace collapsed, outer punctuation stripped."""
+    return _WHITESPACE.sub(" ", text.lower()).strip(" \t\n?!.,;:\"'")
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings bounded by a memory budget, with optional .npz persistence."""
+
+    def __init__(self, dimension, max_bytes, model_name):
+        self.dimension = dimension
+        self.model_name = model_name
+        self.entry_bytes = dimension * np.dtype(np.float32).itemsize + ENTRY_OVERHEAD_BYTES
+        self._cache = TTLCache(max(1, max_bytes // self.entry_bytes))
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, embedding):
+        self._cache.set(key, np.asarray(embedding, dtype=np.float32))
+
+    def encode(self, model, texts):
+        """Embed `texts` through the cache, encoding only the distinct misses in one batch."""
+        keys = [normalize_query(text) for text in texts]
+        vectors = {}
+        for key in keys:
+            if key not in vectors:
+                vectors[key] = self._cache.get(key)
+
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            encoded = model.encode(missing, convert_to_numpy=True).astype(np.float32)
+            for key, vector in zip(missing, encoded):
+                vectors[key] = vector
+                self._cache.set(key, vector)
+
+        return np.vstack([vectors[key] for key in keys])
+
+    def stats(self):
+        stats = self._cache.stats()
+        stats["memory_bytes"] = len(self._cache) * self.entry_bytes
+        stats["memory_budget_bytes"] = self._cache.maxsize * self.entry_bytes
+        return stats
+
+    def save(self, path):
+        """Write the cache atomically to `path` (.npz); most recently used entries are kept last."""
+        items = self._cache.items()
+        if not items:
+            return
+        keys = np.array([key for key, _ in items])
+        embeddings = np.vstack([vector for _, vector in items])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, embeddings=embeddings, model_name=np.array(self.model_name))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Warm the cache from `path`; ignored if missing or written by a different model."""
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            if str(data["model_name"]) != self.model_name or data["embeddings"].shape[1] != self.dimension:
+                print(f"⚠️ Ignoring embedding cache {path}: written by a different model")
+                return 0
+            for key, vector in zip(data["keys"], data["embeddings"]):
+                self._cache.set(str(key), vector)
+            return len(data["keys"])
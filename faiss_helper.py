@@ -1,58 +1,433 @@
 import os
 import json
-import faiss
+import threading
+import time
 import numpy as np
-from collections import defaultdict
-try:
-    from sentence_transformers import SentenceTransformer
-except ImportError as e:
-    raise RuntimeError("Error importing sentence-transformers. Try updating your requirements.") from e
-
-try:
-    from huggingface_hub import cached_download
-except ImportError:
-    print("⚠️ Warning: `cached_download` not found in `huggingface_hub`. Updating module may be required.")
+from embedding_cache import EmbeddingCache, normalize_query
+from knowledge_store import KnowledgeStore, KNOWLEDGE_STORE_DIR, VOCAB_FILE
+from bm25_index import BM25Index, BM25_DIR, reciprocal_rank_fusion
+from index_segments import SegmentedIndex, committed_segments, segments_after, read_segment_entries, read_segment_index
+from ttl_cache import TTLCache
 
 # ✅ FAISS and Embedding Model Setup
-FAISS_INDEX_FILE = "knowledge_index.faiss"
+# Index mode: "flat" (exact), "ivf_flat", "hnsw" or "ivf_pq". Approximate indexes are built
+# from the flat one with `python index_builder.py --mode <mode>`; compare them with benchmark_index.py
+INDEX_MODES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+FAISS_INDEX_MODE = os.getenv("FAISS_INDEX_MODE", "flat")
+if FAISS_INDEX_MODE not in INDEX_MODES:
+    raise RuntimeError(f"FAISS_INDEX_MODE must be one of {', '.join(INDEX_MODES)}")
+FLAT_INDEX_FILE = "knowledge_index.faiss"  # exact index; source of truth for the approximate builds
+
+def index_file_for_mode(mode):
+    return FLAT_INDEX_FILE if mode == "flat" else f"knowledge_index_{mode}.faiss"
+
+FAISS_INDEX_FILE = index_file_for_mode(FAISS_INDEX_MODE)
+# Search-time accuracy/latency knobs for approximate modes
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))        # IVF lists scanned per query
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))  # HNSW candidate list size
 METADATA_FILE = "knowledge_metadata.json"
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Memory-map the index read-only so workers share its pages (set to 0 to read it into memory)
+FAISS_INDEX_MMAP = os.getenv("FAISS_INDEX_MMAP", "1") == "1"
+
+# ✅ Retrieval modes, selectable per request: "vector" (FAISS only) or "hybrid"
+#    (FAISS + BM25 over the same texts, fused with reciprocal rank fusion)
+RETRIEVAL_MODES = ("vector", "hybrid")
+DEFAULT_RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# ✅ Cold-start budget for the retrieval subsystem; exceeding it is logged as a warning
+RETRIEVAL_COLD_START_TARGET_SECONDS = float(os.getenv("RETRIEVAL_COLD_START_TARGET_SECONDS", "20"))
+# How long a search waits for a load that is still in progress (0 = skip retrieval until ready)
+RETRIEVAL_READY_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_READY_TIMEOUT_SECONDS", "0"))
+
+# ✅ Query caches: embeddings by normalized text (memory-bounded, optionally persisted)
+#    and final grouped results by (normalized text, top_k)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+EMBEDDING_CACHE_FILE = os.getenv("EMBEDDING_CACHE_FILE")  # e.g. "query_embeddings.npz"; unset = memory only
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2048"))  # 0 disables
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# Populated by `load_retrieval()`; importing this module stays cheap (no torch/faiss)
+embedding_model = None
+faiss_index = None
+knowledge = None
+bm25 = None
+embedding_cache = None
+# chunk_type -> per-shard faiss.SearchParameters restricting the search to that type (None = no filter needed),
+# ("mask", chunk_type) -> boolean row mask for the same filter on BM25
+_chunk_type_filters = {}
+result_cache = TTLCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS) if RESULT_CACHE_MAX_ENTRIES > 0 else None
 
-# ✅ Load FAISS index
-def load_faiss_index():
+_ready = threading.Event()
+_load_lock = threading.Lock()
+_swap_lock = threading.Lock()
+_thread_lock = threading.Lock()
+_load_thread = None
+_load_state = {
+    "status": "not_started",
+    "load_seconds": None,
+    "error": None,
+}
+
+# ✅ Load FAISS index: the base file plus the segments ingestion appended after it
+def load_faiss_index(previous=None):
+    """Serving index over every row. With `previous` (the index being served) and an unchanged
+    base file, the base and the segments already open are reused and only new segments are read."""
     if not os.path.exists(FAISS_INDEX_FILE):
-        raise RuntimeError("FAISS index file not found! Make sure to embed your data first.")
-    return faiss.read_index(FAISS_INDEX_FILE)
+        if FAISS_INDEX_MODE != "flat":
+            raise RuntimeError(f"{FAISS_INDEX_FILE} not found! Build it with `python index_builder.py --mode {FAISS_INDEX_MODE}`.")
+        return _with_segments(_empty_base_index("FAISS index file not found! Make sure to embed your data first."))
+    stat = os.stat(FAISS_INDEX_FILE)
+    base_stat = (stat.st_mtime_ns, stat.st_size)
+    if previous is not None and previous.base_stat == base_stat:
+        return _with_segments(previous)
+    return _with_segments(SegmentedIndex([(0, read_base_index())], base_stat))
+
+def _empty_base_index(missing_message):
+    """Empty flat base for a knowledge base that was built entirely by ingestion."""
+    import faiss
+
+    segments = committed_segments()
+    if not segments:
+        raise RuntimeError(missing_message)
+    return SegmentedIndex([(0, faiss.IndexFlatL2(read_segment_index(segments[0]).d))])
+
+def _with_segments(index):
+    for manifest in segments_after(index.ntotal):
+        index = index.extend(manifest["start"], read_segment_index(manifest))
+    return index
+
+def read_base_index():
+    import faiss
+
+    if FAISS_INDEX_MMAP:
+        # IO_FLAG_MMAP_IFC maps flat code storage; IO_FLAG_MMAP maps IVF inverted lists
+        for flag in (getattr(faiss, "IO_FLAG_MMAP_IFC", None), faiss.IO_FLAG_MMAP):
+            if flag is None:
+                continue
+            try:
+                return configure_index(faiss.read_index(FAISS_INDEX_FILE, flag | faiss.IO_FLAG_READ_ONLY))
+            except RuntimeError:
+                continue
+        print("⚠️ FAISS index could not be memory-mapped; reading it into memory")
+    return configure_index(faiss.read_index(FAISS_INDEX_FILE))
 
-# ✅ Load metadata for retrieving text
+def configure_index(index):
+    """Apply the search-time knobs (nprobe / efSearch) of approximate indexes."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(FAISS_NPROBE, ivf.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = FAISS_EF_SEARCH
+    return index
+
+def search_parameters(index, selector):
+    """SearchParameters carrying `selector`. Per-call parameters replace the index's own
+    nprobe / efSearch, so the configured values are copied in."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def load_flat_index(io_flags=0):
+    """Exact index over every row: the flat base file (if any) plus all ingested segments."""
+    import faiss
+
+    if not os.path.exists(FLAT_INDEX_FILE):
+        return _with_segments(_empty_base_index(f"{FLAT_INDEX_FILE} not found! Make sure to embed your data first."))
+    return _with_segments(SegmentedIndex([(0, faiss.read_index(FLAT_INDEX_FILE, io_flags))]))
+
+def base_row_count():
+    """Rows in the base index and metadata, read from the flat index header (no JSON parse)."""
+    import faiss
+
+    if not os.path.exists(FLAT_INDEX_FILE):
+        return 0
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(FLAT_INDEX_FILE, flags).ntotal
+
+# ✅ Load metadata for retrieving text: the base file plus the ingested segments' entries
 def load_metadata():
-    if not os.path.exists(METADATA_FILE):
+    segments = committed_segments()
+    if not os.path.exists(METADATA_FILE) and not segments:
         raise RuntimeError("Metadata file not found!")
-    with open(METADATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    metadata = []
+    if os.path.exists(METADATA_FILE):
+        with open(METADATA_FILE, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    for manifest in segments_after(len(metadata)):
+        metadata.extend(read_segment_entries(manifest))
+    return metadata
+
+# ✅ Load the columnar knowledge store, preferring the memory-mapped build over parsing JSON
+def load_knowledge(expected_count):
+    if os.path.exists(os.path.join(KNOWLEDGE_STORE_DIR, VOCAB_FILE)):
+        try:
+            store = KnowledgeStore.open(KNOWLEDGE_STORE_DIR)
+            if len(store) == expected_count:
+                return store
+            print(f"⚠️ {KNOWLEDGE_STORE_DIR}/ has {len(store)} entries but the index has {expected_count}; using {METADATA_FILE}")
+        except Exception as e:
+            print(f"⚠️ Could not open {KNOWLEDGE_STORE_DIR}/: {str(e)}; using {METADATA_FILE}")
+    return KnowledgeStore.from_metadata(load_metadata())
+
+# ✅ Load the BM25 index built alongside the knowledge store, or build it from the texts
+def load_bm25(store):
+    bm25_dir = os.path.join(KNOWLEDGE_STORE_DIR, BM25_DIR)
+    if os.path.exists(os.path.join(bm25_dir, VOCAB_FILE)):
+        try:
+            index = BM25Index.open(KNOWLEDGE_STORE_DIR)
+            if index.doc_count == len(store):
+                return index
+            print(f"⚠️ {bm25_dir}/ has {index.doc_count} documents but the store has {len(store)}; rebuilding in memory")
+        except Exception as e:
+            print(f"⚠️ Could not open {bm25_dir}/: {str(e)}; rebuilding in memory")
+    return BM25Index.build(store.texts)
+
+def load_appended(store, bm25_index, expected_count):
+    """Extend the serving store and BM25 index with the segments ingestion appended, opening
+    only those; returns None when they do not add up to `expected_count` rows."""
+    try:
+        new_store = store.with_new_segments(KNOWLEDGE_STORE_DIR)
+        new_bm25 = bm25_index.with_new_segments(KNOWLEDGE_STORE_DIR)
+    except Exception as e:
+        print(f"⚠️ Could not open appended knowledge segments: {str(e)}")
+        return None
+    if not (len(new_store) == new_bm25.doc_count == expected_count):
+        return None
+    return new_store, new_bm25
 
 # ✅ Load Sentence Transformer Model for Encoding Queries
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-faiss_index = load_faiss_index()
-metadata = load_metadata()
+def load_embedding_model():
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError as e:
+        raise RuntimeError("Error importing sentence-transformers. Try updating your requirements.") from e
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+def load_retrieval():
+    """Load the embedding model, FAISS index and metadata (blocking). Safe to call repeatedly."""
+    global embedding_model, faiss_index, knowledge, bm25, embedding_cache, _chunk_type_filters
+    with _load_lock:
+        if _ready.is_set():
+            return
+        _load_state.update(status="loading", error=None)
+        started = time.monotonic()
+        try:
+            embedding_model = load_embedding_model()
+            faiss_index = load_faiss_index()
+            knowledge = load_knowledge(faiss_index.ntotal)
+            bm25 = load_bm25(knowledge)
+            _chunk_type_filters = {}
+            embedding_cache = load_embedding_cache(embedding_model)
+        except Exception as e:
+            _load_state.update(status="failed", error=f"{type(e).__name__}: {e}")
+            print(f"❌ Retrieval load failed: {str(e)}")
+            raise
+        load_seconds = time.monotonic() - started
+        _load_state.update(status="ready", load_seconds=round(load_seconds, 3))
+        _ready.set()
+
+    if load_seconds > RETRIEVAL_COLD_START_TARGET_SECONDS:
+        print(f"⚠️ Retrieval ready in {load_seconds:.1f}s, over the {RETRIEVAL_COLD_START_TARGET_SECONDS:.0f}s cold-start target")
+    else:
+        print(f"✅ Retrieval ready in {load_seconds:.1f}s")
+
+def chunk_type_filter(index, store, filters, chunk_type):
+    """Search parameters that restrict FAISS to rows of `chunk_type`, built once per type and store.
+
+    Returns None when every row already has that type, so the common case stays unfiltered.
+    """
+    if chunk_type not in filters:
+        import faiss
+
+        ids = store.ids_for_chunk_type(chunk_type)
+        if len(ids) == len(store):
+            filters[chunk_type] = None
+        else:
+            filters[chunk_type] = [
+                search_parameters(shard, faiss.IDSelectorBatch(shard_ids))
+                for (_, shard), shard_ids in zip(index.shards, index.shard_ids(ids))
+            ]
+    return filters[chunk_type]
+
+def chunk_type_mask(store, filters, chunk_type):
+    """Boolean row mask for `chunk_type` (None when every row has it), cached like `chunk_type_filter`."""
+    key = ("mask", chunk_type)
+    if key not in filters:
+        ids = store.ids_for_chunk_type(chunk_type)
+        if len(ids) == len(store):
+            filters[key] = None
+        else:
+            mask = np.zeros(len(store), dtype=bool)
+            mask[ids] = True
+            filters[key] = mask
+    return filters[key]
+
+def _snapshot():
+    """Index, store, BM25 index and filter cache as one consistent tuple (see `reload_index`)."""
+    with _swap_lock:
+        return faiss_index, knowledge, bm25, _chunk_type_filters
+
+def reload_index():
+    """Swap in a rebuilt index and knowledge store (e.g. after ingestion) without reloading the model.
+
+    Rows appended by ingestion are picked up by opening just their segments.
+    """
+    global faiss_index, knowledge, bm25, _chunk_type_filters
+    if not _ready.is_set():
+        ensure_loaded(None)
+        return
+    current_index, current_knowledge, current_bm25, _ = _snapshot()
+    new_index = load_faiss_index(current_index)
+    appended = load_appended(current_knowledge, current_bm25, new_index.ntotal)
+    if appended is not None:
+        new_knowledge, new_bm25 = appended
+    else:
+        new_knowledge = load_knowledge(new_index.ntotal)
+        new_bm25 = load_bm25(new_knowledge)
+    with _swap_lock:
+        faiss_index, knowledge, bm25, _chunk_type_filters = new_index, new_knowledge, new_bm25, {}
+    if result_cache is not None:
+        result_cache.clear()
+    print(f"✅ Reloaded FAISS index ({new_index.ntotal} rows)")
+
+def load_embedding_cache(model):
+    cache = EmbeddingCache(model.get_sentence_embedding_dimension(), EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_MODEL_NAME)
+    if EMBEDDING_CACHE_FILE:
+        try:
+            loaded = cache.load(EMBEDDING_CACHE_FILE)
+            print(f"✅ Loaded {loaded} cached query embeddings")
+        except Exception as e:
+            print(f"⚠️ Could not load embedding cache: {str(e)}")
+    return cache
+
+def save_embedding_cache():
+    """Persist query embeddings for the next start; called from the FastAPI shutdown hook."""
+    if EMBEDDING_CACHE_FILE and embedding_cache is not None:
+        try:
+            embedding_cache.save(EMBEDDING_CACHE_FILE)
+        except Exception as e:
+            print(f"⚠️ Could not save embedding cache: {str(e)}")
+
+def query_cache_stats():
+    """Hit rates and memory use of the query embedding and result caches."""
+    return {
+        "embeddings": embedding_cache.stats() if embedding_cache is not None else {},
+        "results": result_cache.stats() if result_cache is not None else {},
+    }
+
+def encode_queries(queries):
+    """Embed queries as a float32 matrix, reusing cached embeddings for repeated questions."""
+    if embedding_cache is None:
+        return embedding_model.encode(list(queries), convert_to_numpy=True).astype(np.float32)
+    return embedding_cache.encode(embedding_model, queries)
+
+def _load_in_background():
+    try:
+        load_retrieval()
+    except Exception:
+        pass  # Recorded in _load_state and reported by /health
+
+def start_background_load():
+    """Begin loading retrieval on a daemon thread so the app can serve requests immediately."""
+    global _load_thread
+    with _thread_lock:
+        if _ready.is_set() or (_load_thread is not None and _load_thread.is_alive()):
+            return
+        _load_thread = threading.Thread(target=_load_in_background, name="retrieval-loader", daemon=True)
+        _load_thread.start()
+
+def ensure_loaded(timeout=None):
+    """Wait up to `timeout` seconds (None = forever) for retrieval; returns True when ready."""
+    if _ready.is_set():
+        return True
+    if _load_state["status"] == "failed":
+        return False
+    if timeout is None and _load_thread is None:
+        load_retrieval()
+        return True
+    start_background_load()
+    return _ready.wait(timeout)
+
+def is_ready():
+    return _ready.is_set()
+
+def retrieval_status():
+    """Readiness and cold-start timing for the health endpoint."""
+    return {
+        "ready": _ready.is_set(),
+        "index_mode": FAISS_INDEX_MODE,
+        "cold_start_target_seconds": RETRIEVAL_COLD_START_TARGET_SECONDS,
+        **_load_state,
+    }
+
+
+def search_faiss_batch(queries, top_k=3, chunk_type="example", mode=None):
+    """Retrieve grouped `chunk_type` snippets for several queries with one encode and one index search.
+
+    The chunk-type filter is applied inside FAISS, so all `top_k` hits are usable. In "hybrid"
+    mode the FAISS and BM25 rankings are fused with reciprocal rank fusion.
+    Returns one result list per query, in order.
+    """
+    mode = mode or DEFAULT_RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+    if not queries:
+        return []
+    if not ensure_loaded(RETRIEVAL_READY_TIMEOUT_SECONDS):
+        print("⚠️ Retrieval still loading, answering without retrieved knowledge")
+        return [[] for _ in queries]
+
+    keys = [(normalize_query(query), top_k, chunk_type, mode) for query in queries]
+    results = [None] * len(queries)
+    if result_cache is not None:
+        for i, key in enumerate(keys):
+            cached = result_cache.get(key)
+            if cached is not None:
+                results[i] = list(cached)
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+
+    index, store, lexical, filters = _snapshot()
+    depth = max(top_k, HYBRID_CANDIDATES) if mode == "hybrid" else top_k
+    query_embeddings = encode_queries([queries[i] for i in pending])
+    params = chunk_type_filter(index, store, filters, chunk_type)
+    if params is None:
+        distances, indices = index.search(query_embeddings, depth)
+    else:
+        distances, indices = index.search(query_embeddings, depth, params=params)
+
+    for i, row_indices in zip(pending, indices):
+        row_indices = row_indices[(row_indices >= 0) & (row_indices < len(store))]
+        if mode == "hybrid":
+            lexical_ids, _ = lexical.search(queries[i], depth, chunk_type_mask(store, filters, chunk_type))
+            row_indices = reciprocal_rank_fusion([row_indices, lexical_ids], top_k, RRF_K)
+
+        # ✅ Group by topic (first-hit order) and merge examples within the same topic path
+        grouped_examples = {}
+        for idx in row_indices:
+            grouped_examples.setdefault(store.topic_ids[idx], []).append(store.text(idx))
+
+        merged_results = [". ".join(examples) for examples in grouped_examples.values()]
+        if result_cache is not None:
+            result_cache.set(keys[i], merged_results)
+        results[i] = list(merged_results)
+
+    return results
 
 
-def search_faiss(query, top_k=3):
+def search_faiss(query, top_k=3, chunk_type="example", mode=None):
     """Retrieve the most relevant example-based knowledge snippets from FAISS."""
-    query_embedding = embedding_model.encode([query], convert_to_numpy=True).astype(np.float32)
-    distances, indices = faiss_index.search(query_embedding, top_k)
-
-    grouped_examples = defaultdict(list)
-    for dist, idx in zip(distances[0], indices[0]):
-        if idx < 0 or idx >= len(metadata):
-            continue
-
-        entry = metadata[idx]
-        if entry.get("chunk_type") == "example":
-            topic_path = entry.get("topic_path", "unknown_topic")  # Group by topic
-            grouped_examples[topic_path].append(entry["text"])
-
-    # ✅ Merge examples within the same topic path
-    merged_results = [". ".join(examples) for examples in grouped_examples.values()]
-    
-    return merged_results
\ No newline at end of file
+    return search_faiss_batch([query], top_k, chunk_type, mode)[0]
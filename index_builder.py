@@ -0,0 +1,85 @@
+import argparse
+import math
+import os
+import numpy as np
+import faiss_helper
+
+# ✅ Build approximate FAISS indexes from the exact flat index (the source of truth).
+#
+#    flat      exact L2 scan, O(N) per query
+#    ivf_flat  k-means coarse quantizer; scans `nprobe` of `nlist` lists, full vectors
+#    hnsw      graph search; no training, fastest queries, ~M * 8 bytes extra per vector
+#    ivf_pq    IVF + product quantization; vectors compressed to `pq_m` bytes, for 1M+ chunks
+#
+#    Search-time knobs live in faiss_helper (FAISS_NPROBE, FAISS_EF_SEARCH).
+
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "48"))  # sub-quantizers; must divide the dimension (384 for MiniLM)
+# faiss warns below 39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def default_nlist(n):
+    """~4 * sqrt(N) inverted lists, capped so every centroid gets enough training points."""
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def default_pq_nbits(n):
+    """8-bit codes once there is enough data to train 256 centroids per sub-quantizer."""
+    return max(4, min(8, int(math.log2(max(n // MIN_POINTS_PER_CENTROID, 16)))))
+
+
+def build_index(embeddings, mode, nlist=None, hnsw_m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, pq_m=PQ_M):
+    """Build an L2 index of `mode` over float32 `embeddings`; rows keep their positions as ids."""
+    import faiss
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    n, dimension = embeddings.shape
+
+    if mode == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif mode == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    elif mode in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatL2(dimension)
+        if mode == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            if dimension % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dimension}")
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, default_pq_nbits(n))
+        index.train(embeddings)
+    else:
+        raise ValueError(f"Unknown index mode {mode!r}; expected one of {', '.join(faiss_helper.INDEX_MODES)}")
+
+    index.add(embeddings)
+    return index
+
+
+def load_flat_embeddings():
+    """Read back every vector stored in the exact index, including ingested segments."""
+    index = faiss_helper.load_flat_index()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+# ✅ CLI: `python index_builder.py --mode hnsw` writes knowledge_index_hnsw.faiss
+if __name__ == "__main__":
+    from ingest_knowledge import write_index_atomic
+
+    parser = argparse.ArgumentParser(description="Build an approximate FAISS index from the flat knowledge index.")
+    parser.add_argument("--mode", choices=[m for m in faiss_helper.INDEX_MODES if m != "flat"], required=True)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default ~4 * sqrt(N))")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--pq-m", type=int, default=PQ_M)
+    args = parser.parse_args()
+
+    embeddings = load_flat_embeddings()
+    index = build_index(embeddings, args.mode, nlist=args.nlist, hnsw_m=args.hnsw_m,
+                        ef_construction=args.ef_construction, pq_m=args.pq_m)
+    output = faiss_helper.index_file_for_mode(args.mode)
+    write_index_atomic(index, output)
+    print(f"✅ Wrote {output} ({args.mode}, {index.ntotal} vectors); serve it with FAISS_INDEX_MODE={args.mode}")
@@ -0,0 +1,111 @@
+import json
+import os
+import numpy as np
+
+# ✅ Rows appended by ingestion, one segment per run:
+#
+#        knowledge_segments/<first row>.faiss   exact (flat) vectors of the run's rows
+#        knowledge_segments/<first row>.jsonl   their metadata entries, one per line
+#        knowledge_segments/<first row>.json    {"start", "count", "doc_ids"}; written last, the commit marker
+#
+#    Ingestion never rewrites the base knowledge_index*.faiss or knowledge_metadata.json, so a
+#    run costs what its new documents cost. The serving index is the base index followed by
+#    every segment past its last row; `python index_builder.py` folds the segments into a
+#    rebuilt approximate index, after which they are skipped.
+INDEX_SEGMENTS_DIR = "knowledge_segments"
+
+
+def segment_file(start, suffix, directory=INDEX_SEGMENTS_DIR):
+    return os.path.join(directory, f"{start:010d}{suffix}")
+
+def committed_segments(directory=INDEX_SEGMENTS_DIR):
+    """Manifests of every committed segment, ascending by first row."""
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for name in os.listdir(directory):
+        if name.endswith(".json") and name[:-len(".json")].isdigit():
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda manifest: manifest["start"])
+
+def segments_after(row, directory=INDEX_SEGMENTS_DIR):
+    """Committed segments holding rows at or past `row`; they must start exactly there and be contiguous."""
+    manifests = []
+    for manifest in committed_segments(directory):
+        start, end = manifest["start"], manifest["start"] + manifest["count"]
+        if end <= row:
+            continue  # already folded into the base
+        if start != row:
+            raise RuntimeError(f"Index segment {start} in {directory} does not continue row {row}; rebuild the index")
+        manifests.append(manifest)
+        row = end
+    return manifests
+
+def read_segment_entries(manifest, directory=INDEX_SEGMENTS_DIR):
+    with open(segment_file(manifest["start"], ".jsonl", directory), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def read_segment_index(manifest, directory=INDEX_SEGMENTS_DIR):
+    import faiss
+
+    index = faiss.read_index(segment_file(manifest["start"], ".faiss", directory))
+    if index.ntotal != manifest["count"]:
+        raise RuntimeError(f"Index segment {manifest['start']} has {index.ntotal} vectors, expected {manifest['count']}")
+    return index
+
+
+class SegmentedIndex:
+    """A base FAISS index followed by the flat indexes of appended segments, searched as one.
+
+    Row ids are global (a shard's local id i is row start + i). Every shard is L2, so merging
+    the per-shard results by distance gives what one index over all rows would return.
+    """
+
+    def __init__(self, shards, base_stat=None):
+        self.shards = shards  # [(first row, index)]
+        self.base_stat = base_stat  # (mtime_ns, size) of the base file, to reuse it across reloads
+        self.d = shards[0][1].d
+        self.ntotal = shards[-1][0] + shards[-1][1].ntotal
+
+    @property
+    def base(self):
+        return self.shards[0][1]
+
+    def extend(self, start, index):
+        if start != self.ntotal:
+            raise RuntimeError(f"Index segment {start} does not continue row {self.ntotal}")
+        return SegmentedIndex(self.shards + [(start, index)], self.base_stat)
+
+    def shard_ids(self, ids):
+        """Global row ids split into each shard's local ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        return [ids[(ids >= start) & (ids < start + index.ntotal)] - start for start, index in self.shards]
+
+    def search(self, x, k, params=None):
+        """`params` is None or one SearchParameters (or None) per shard."""
+        results = []
+        for i, (start, index) in enumerate(self.shards):
+            shard_params = params[i] if params is not None else None
+            if shard_params is None:
+                distances, labels = index.search(x, k)
+            else:
+                distances, labels = index.search(x, k, params=shard_params)
+            if len(self.shards) == 1:
+                return distances, labels
+            found = labels >= 0
+            results.append((np.where(found, distances, np.inf), np.where(found, labels + start, -1)))
+
+        distances = np.hstack([distances for distances, _ in results])
+        labels = np.hstack([labels for _, labels in results])
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(labels, order, axis=1)
+
+    def reconstruct_n(self, start, n):
+        """Stored vectors of rows [start, start + n), across shard boundaries."""
+        parts = []
+        for shard_start, index in self.shards:
+            lo, hi = max(start, shard_start), min(start + n, shard_start + index.ntotal)
+            if lo < hi:
+                parts.append(index.reconstruct_n(lo - shard_start, hi - lo))
+        return np.vstack(parts) if parts else np.empty((0, self.d), dtype=np.float32)
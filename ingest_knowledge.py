@@ -0,0 +1,228 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import numpy as np
+import faiss_helper
+from knowledge_store import KnowledgeStore, KNOWLEDGE_STORE_DIR, VOCAB_FILE, segment_dir, segment_starts
+from bm25_index import BM25Segment, BM25_DIR
+from index_segments import INDEX_SEGMENTS_DIR, committed_segments, segment_file
+
+# ✅ Incremental ingestion: documents -> sentence chunks -> batched MiniLM encoding -> index.add.
+#
+#    Input is JSON Lines, one document per line:
+#        {"doc_id": "optional-stable-id", "text": "...", "topic_path": "training > tapering", "chunk_type": "example"}
+#
+#    Row ids are positions in the index, so new chunks get ids ntotal, ntotal + 1, ...
+#    and existing ids never change. A run writes only its new rows: their vectors and
+#    metadata as an index segment (see index_segments.py) and, when the memory-mapped store
+#    exists, a knowledge store segment with their texts, columns and BM25 postings. The base
+#    index and knowledge_metadata.json are never read or rewritten, so a run costs what its
+#    documents cost. The segment manifest, holding the run's doc ids, is written last and is
+#    the commit point: a run that crashes is rolled back and a re-run skips documents
+#    already committed.
+
+INGEST_LOCK_FILE = "knowledge_ingest.lock"
+CHUNK_MAX_CHARS = int(os.getenv("INGEST_CHUNK_MAX_CHARS", "300"))
+ENCODE_BATCH_SIZE = int(os.getenv("INGEST_ENCODE_BATCH_SIZE", "64"))
+# Chunks encoded and added to the in-memory index per step (bounds memory for large inputs)
+ADD_BATCH_CHUNKS = int(os.getenv("INGEST_ADD_BATCH_CHUNKS", "4096"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def document_id(document):
+    """Stable id for a document: its explicit `doc_id`, else a hash of topic and text."""
+    if document.get("doc_id"):
+        return str(document["doc_id"])
+    digest = hashlib.sha256(f"{document.get('topic_path', '')}\n{document['text']}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def chunk_text(text, max_chars=CHUNK_MAX_CHARS):
+    """Split text into sentence chunks, breaking over-long sentences at word boundaries."""
+    chunks = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = " ".join(sentence.split())
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            chunks.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            chunks.append(sentence)
+    return chunks
+
+
+def iter_documents(paths):
+    """Stream documents from JSON Lines files without loading them whole."""
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                document = json.loads(line)
+                if not document.get("text"):
+                    raise ValueError(f"{path}:{line_number}: document has no text")
+                yield document
+
+
+def write_atomic(path, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_index_atomic(index, path):
+    import faiss
+
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def committed_row_count(manifests):
+    """Rows committed so far: the base index plus every committed segment."""
+    if manifests:
+        return manifests[-1]["start"] + manifests[-1]["count"]
+    return faiss_helper.base_row_count()
+
+
+def drop_uncommitted_segments(first_row):
+    """Remove the files a crashed run wrote past the last committed row."""
+    if os.path.isdir(INDEX_SEGMENTS_DIR):
+        for name in os.listdir(INDEX_SEGMENTS_DIR):
+            stem = name.split(".", 1)[0]
+            if stem.isdigit() and int(stem) >= first_row:
+                print(f"⚠️ Removing uncommitted index segment file {name}")
+                os.remove(os.path.join(INDEX_SEGMENTS_DIR, name))
+    for start in segment_starts(KNOWLEDGE_STORE_DIR):
+        if start >= first_row:
+            print(f"⚠️ Removing uncommitted knowledge store segment {start}")
+            shutil.rmtree(segment_dir(KNOWLEDGE_STORE_DIR, start))
+
+
+class _IngestLock:
+    """Exclusive flock on the lock file so two ingesters never interleave writes.
+
+    The kernel releases it when the holder exits, so a crashed run never blocks the next one.
+    """
+
+    def __enter__(self):
+        self._file = open(INGEST_LOCK_FILE, "a+")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            raise RuntimeError("Another ingestion is running")
+        self._file.truncate(0)
+        self._file.write(str(os.getpid()))
+        self._file.flush()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+
+
+def ingest_documents(documents, model=None, add_batch_chunks=ADD_BATCH_CHUNKS,
+                     encode_batch_size=ENCODE_BATCH_SIZE):
+    """Append new documents as one index segment (plus a knowledge store segment); returns a summary dict.
+
+    Only new chunks are encoded, and documents whose `doc_id` a committed segment already
+    holds are skipped. Nothing existing is rewritten.
+    """
+    import faiss
+
+    model = model or faiss_helper.embedding_model or faiss_helper.load_embedding_model()
+
+    with _IngestLock():
+        manifests = committed_segments()
+        first_row = committed_row_count(manifests)
+        drop_uncommitted_segments(first_row)
+        seen_doc_ids = {doc_id for manifest in manifests for doc_id in manifest["doc_ids"]}
+
+        index = faiss.IndexFlatL2(model.get_sentence_embedding_dimension())
+        summary = {"documents_added": 0, "documents_skipped": 0, "chunks_added": 0, "batches": 0, "first_row": first_row}
+        new_entries = []
+        new_doc_ids = []
+        pending_entries = []
+
+        def add_pending():
+            # Encode and add whole documents only; nothing is written until the run commits
+            if not pending_entries:
+                return
+            texts = [entry["text"] for entry in pending_entries]
+            embeddings = model.encode(texts, batch_size=encode_batch_size, convert_to_numpy=True).astype(np.float32)
+            index.add(embeddings)
+            new_entries.extend(pending_entries)
+            summary["batches"] += 1
+            pending_entries.clear()
+
+        for document in documents:
+            doc_id = document_id(document)
+            if doc_id in seen_doc_ids:
+                summary["documents_skipped"] += 1
+                continue
+            seen_doc_ids.add(doc_id)
+
+            chunks = chunk_text(document["text"])
+            for text in chunks:
+                pending_entries.append({
+                    "id": first_row + len(new_entries) + len(pending_entries),
+                    "text": text,
+                    "topic_path": document.get("topic_path", "unknown_topic"),
+                    "chunk_type": document.get("chunk_type", "example"),
+                    "doc_id": doc_id,
+                })
+            if chunks:
+                new_doc_ids.append(doc_id)
+            summary["documents_added"] += 1
+
+            if len(pending_entries) >= add_batch_chunks:
+                add_pending()
+        add_pending()
+
+        if new_entries:
+            # Vectors, store segment and metadata first, then the manifest that commits them
+            os.makedirs(INDEX_SEGMENTS_DIR, exist_ok=True)
+            write_index_atomic(index, segment_file(first_row, ".faiss"))
+            if os.path.exists(os.path.join(KNOWLEDGE_STORE_DIR, VOCAB_FILE)):
+                segment = KnowledgeStore.from_metadata(new_entries)
+                segment.write_segment(KNOWLEDGE_STORE_DIR, first_row)
+                BM25Segment.build(segment.texts).write(os.path.join(segment_dir(KNOWLEDGE_STORE_DIR, first_row), BM25_DIR))
+            write_atomic(segment_file(first_row, ".jsonl"), lambda f: f.writelines(
+                json.dumps(entry, ensure_ascii=False) + "\n" for entry in new_entries
+            ))
+            write_atomic(segment_file(first_row, ".json"), lambda f: json.dump(
+                {"start": first_row, "count": len(new_entries), "doc_ids": new_doc_ids}, f
+            ))
+            summary["chunks_added"] = len(new_entries)
+            print(f"✅ Committed {len(new_entries)} new chunks ({first_row + len(new_entries)} total)")
+
+    return summary
+
+
+# ✅ CLI: `python ingest_knowledge.py new_content.jsonl [more.jsonl ...]`
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append coaching content to the FAISS knowledge index.")
+    parser.add_argument("paths", nargs="+", help="JSON Lines files, one document per line")
+    parser.add_argument("--add-batch-chunks", type=int, default=ADD_BATCH_CHUNKS)
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    result = ingest_documents(
+        iter_documents(args.paths),
+        add_batch_chunks=args.add_batch_chunks,
+        encode_batch_size=args.encode_batch_size,
+    )
+    print(f"✅ Ingestion complete: {json.dumps(result)}")
@@ -0,0 +1,224 @@
+import json
+import mmap
+import os
+import shutil
+import numpy as np
+
+UNKNOWN_TOPIC = "unknown_topic"
+
+# ✅ On-disk layout: one directory of memory-mappable files, so every worker shares the
+#    same page-cache pages instead of holding its own parsed copy of the metadata JSON.
+KNOWLEDGE_STORE_DIR = "knowledge_store"
+OFFSETS_FILE = "offsets.npy"            # int64[n + 1] byte offsets into texts.bin
+TEXTS_FILE = "texts.bin"                # UTF-8 texts, concatenated
+CHUNK_TYPE_IDS_FILE = "chunk_type_ids.npy"
+TOPIC_IDS_FILE = "topic_ids.npy"
+VOCAB_FILE = "vocab.json"               # names for the id columns; written last, acts as the commit marker
+# Rows appended by ingestion: segments/<first row id>/ holds the same files for just those rows.
+# `python knowledge_store.py` rewrites the base store from the metadata and drops the segments.
+SEGMENTS_DIR = "segments"
+
+
+def segment_dir(directory, start):
+    return os.path.join(directory, SEGMENTS_DIR, f"{start:010d}")
+
+def segment_starts(directory):
+    """First row id of every segment under `directory`, ascending."""
+    path = os.path.join(directory, SEGMENTS_DIR)
+    if not os.path.isdir(path):
+        return []
+    return sorted(int(name) for name in os.listdir(path) if name.isdigit())
+
+
+class MappedTexts:
+    """Read-only sequence of strings backed by an offsets table and a text blob."""
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.blob[start:end].decode("utf-8")
+
+
+class ChainedTexts:
+    """Texts of several stores laid end to end, addressed by global row id."""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.starts = np.cumsum([0] + [len(part) for part in parts])
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def __getitem__(self, idx):
+        part = int(np.searchsorted(self.starts, idx, side="right")) - 1
+        return self.parts[part][idx - self.starts[part]]
+
+
+class KnowledgeStore:
+    """Columnar view of the knowledge metadata, indexed by FAISS row id.
+
+    Chunk types and topic paths are dictionary-encoded into small integer arrays so
+    filtering and grouping never touch per-entry dicts.
+    """
+
+    def __init__(self, texts, chunk_type_ids, chunk_type_names, topic_ids, topic_names):
+        self.texts = texts
+        self.chunk_type_ids = chunk_type_ids
+        self.chunk_type_names = chunk_type_names
+        self.topic_ids = topic_ids
+        self.topic_names = topic_names
+
+    @classmethod
+    def from_metadata(cls, entries):
+        """Build the store in memory from the `knowledge_metadata.json` list of dicts."""
+        chunk_type_codes = {}
+        topic_codes = {}
+        texts = []
+        chunk_type_ids = np.empty(len(entries), dtype=np.int16)
+        topic_ids = np.empty(len(entries), dtype=np.int32)
+
+        for i, entry in enumerate(entries):
+            texts.append(entry["text"])
+            chunk_type_ids[i] = chunk_type_codes.setdefault(entry.get("chunk_type"), len(chunk_type_codes))
+            topic_ids[i] = topic_codes.setdefault(entry.get("topic_path", UNKNOWN_TOPIC), len(topic_codes))
+
+        return cls(texts, chunk_type_ids, list(chunk_type_codes), topic_ids, list(topic_codes))
+
+    @classmethod
+    def open(cls, directory=KNOWLEDGE_STORE_DIR):
+        """Memory-map a store written by `write`, plus any appended segments."""
+        return cls._open_files(directory).with_new_segments(directory)
+
+    @classmethod
+    def _open_files(cls, directory):
+        """Memory-map one store directory. Pages are loaded lazily and shared between processes."""
+        with open(os.path.join(directory, VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+
+        offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        chunk_type_ids = np.load(os.path.join(directory, CHUNK_TYPE_IDS_FILE), mmap_mode="r")
+        topic_ids = np.load(os.path.join(directory, TOPIC_IDS_FILE), mmap_mode="r")
+        if not (len(offsets) - 1 == len(chunk_type_ids) == len(topic_ids) == vocab["count"]):
+            raise RuntimeError(f"Knowledge store in {directory} is inconsistent; rebuild it")
+
+        texts_path = os.path.join(directory, TEXTS_FILE)
+        if os.path.getsize(texts_path) == 0:
+            blob = b""
+        else:
+            with open(texts_path, "rb") as f:
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(MappedTexts(offsets, blob), chunk_type_ids, vocab["chunk_type_names"],
+                   topic_ids, vocab["topic_names"])
+
+    def with_new_segments(self, directory=KNOWLEDGE_STORE_DIR):
+        """This store extended by the segments under `directory` that start at or after its last row."""
+        store = self
+        for start in segment_starts(directory):
+            if start < len(store):
+                continue
+            if start > len(store):
+                raise RuntimeError(f"Knowledge store segment {start} in {directory} leaves a gap after row {len(store)}")
+            store = store.extend(KnowledgeStore._open_files(segment_dir(directory, start)))
+        return store
+
+    def extend(self, other):
+        """New store with `other`'s rows appended; its column codes are remapped into this store's names.
+
+        Texts stay where they are (mapped or in memory); only the small id columns are copied.
+        """
+        def merge(names, other_names):
+            codes = {name: code for code, name in enumerate(names)}
+            for name in other_names:
+                if name not in codes:
+                    codes[name] = len(names)
+                    names.append(name)
+            return np.array([codes[name] for name in other_names], dtype=np.int64)
+
+        chunk_type_names = list(self.chunk_type_names)
+        topic_names = list(self.topic_names)
+        chunk_type_map = merge(chunk_type_names, other.chunk_type_names)
+        topic_map = merge(topic_names, other.topic_names)
+
+        parts = self.texts.parts if isinstance(self.texts, ChainedTexts) else [self.texts]
+        chunk_type_ids = np.concatenate([
+            np.asarray(self.chunk_type_ids, dtype=np.int16),
+            chunk_type_map[np.asarray(other.chunk_type_ids, dtype=np.int64)].astype(np.int16),
+        ])
+        topic_ids = np.concatenate([
+            np.asarray(self.topic_ids, dtype=np.int32),
+            topic_map[np.asarray(other.topic_ids, dtype=np.int64)].astype(np.int32),
+        ])
+        return KnowledgeStore(ChainedTexts(parts + [other.texts]), chunk_type_ids, chunk_type_names,
+                              topic_ids, topic_names)
+
+    def write_segment(self, directory, start):
+        """Write these rows as the segment starting at row `start` of the store in `directory`."""
+        self.write(segment_dir(directory, start))
+
+    def write(self, directory=KNOWLEDGE_STORE_DIR):
+        """Write the store as memory-mappable files; each file is replaced atomically.
+
+        Any appended segments are dropped: the written store is complete on its own.
+        """
+        os.makedirs(directory, exist_ok=True)
+        encoded = [self.text(i).encode("utf-8") for i in range(len(self))]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in encoded], out=offsets[1:])
+
+        def replace(name, write):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        # Drop the commit marker first so a crash mid-write leaves an unreadable (not a mismatched) store
+        vocab_path = os.path.join(directory, VOCAB_FILE)
+        if os.path.exists(vocab_path):
+            os.remove(vocab_path)
+
+        replace(TEXTS_FILE, lambda f: f.write(b"".join(encoded)))
+        replace(OFFSETS_FILE, lambda f: np.save(f, offsets))
+        replace(CHUNK_TYPE_IDS_FILE, lambda f: np.save(f, np.asarray(self.chunk_type_ids, dtype=np.int16)))
+        replace(TOPIC_IDS_FILE, lambda f: np.save(f, np.asarray(self.topic_ids, dtype=np.int32)))
+        replace(VOCAB_FILE, lambda f: f.write(json.dumps({
+            "count": len(self),
+            "chunk_type_names": self.chunk_type_names,
+            "topic_names": self.topic_names,
+        }).encode("utf-8")))
+        shutil.rmtree(os.path.join(directory, SEGMENTS_DIR), ignore_errors=True)
+
+    def __len__(self):
+        return len(self.chunk_type_ids)
+
+    def text(self, idx):
+        return self.texts[idx]
+
+    def topic(self, idx):
+        return self.topic_names[self.topic_ids[idx]]
+
+    def ids_for_chunk_type(self, chunk_type):
+        """Row ids of every entry with the given chunk type (empty if the type is unknown)."""
+        if chunk_type not in self.chunk_type_names:
+            return np.empty(0, dtype=np.int64)
+        code = self.chunk_type_names.index(chunk_type)
+        return np.flatnonzero(self.chunk_type_ids == code).astype(np.int64)
+
+
+# ✅ Build the store from knowledge_metadata.json: `python knowledge_store.py`
+if __name__ == "__main__":
+    from bm25_index import BM25Segment, BM25_DIR
+    from faiss_helper import METADATA_FILE, load_metadata
+
+    store = KnowledgeStore.from_metadata(load_metadata())
+    store.write(KNOWLEDGE_STORE_DIR)
+    BM25Segment.build(store.texts).write(os.path.join(KNOWLEDGE_STORE_DIR, BM25_DIR))
+    print(f"✅ Wrote {len(store)} entries from {METADATA_FILE} to {KNOWLEDGE_STORE_DIR}/")
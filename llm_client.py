@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import httpx
+from config import OPENAI_API_KEY, GEMINI_API_KEY
+
+# ✅ OpenAI endpoint and default model
+OPENAI_API_URL = "https://api.openai.com/v1/chat/completions"
+OPENAI_MODEL = "gpt-4-turbo"
+
+# ✅ Gemini endpoint and default model
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+GEMINI_MODEL = "gemini-1.5-pro"
+
+# ✅ Connection pool, timeout and concurrency settings (override via environment)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "200"))
+
+ERROR_RESPONSE = "Error: Unable to get response."
+
+_http_client = None
+_semaphore = None
+
+
+class LLMError(Exception):
+    """Raised when an LLM provider call fails or returns an unusable response."""
+
+
+def get_http_client():
+    """Return the shared async HTTP client, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+        )
+    return _http_client
+
+
+def get_semaphore():
+    """Return the semaphore that caps in-flight LLM requests for this worker."""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def close_http_client():
+    """Close pooled connections; called from the FastAPI shutdown hook."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def openai_complete(prompt, system_prompt=None, max_tokens=50, model=OPENAI_MODEL, timeout=None):
+    """Send a chat completion request to OpenAI and return the message text.
+
+    Raises `LLMError` on transport errors, timeouts and non-200 responses.
+    """
+    if not OPENAI_API_KEY:
+        raise LLMError("OpenAI API key is missing")
+
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+    payload = {"model": model, "messages": messages, "max_tokens": max_tokens}
+
+    async with get_semaphore():
+        try:
+            response = await get_http_client().post(
+                OPENAI_API_URL,
+                json=payload,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+        except httpx.HTTPError as e:
+            raise LLMError(f"OpenAI request failed: {type(e).__name__}: {e}") from e
+
+    if response.status_code != 200:
+        raise LLMError(f"OpenAI API Error: {response.status_code} - {response.text}")
+
+    try:
+        return response.json()["choices"][0]["message"]["content"]
+    except (ValueError, KeyError, IndexError) as e:
+        raise LLMError(f"Unexpected OpenAI response: {response.text}") from e
+
+
+async def openai_stream(prompt, system_prompt=None, max_tokens=50, model=OPENAI_MODEL, timeout=None):
+    """Stream a chat completion from OpenAI, yielding text deltas as they arrive.
+
+    The concurrency slot is held until the stream is exhausted or closed.
+    Raises `LLMError` on transport errors and non-200 responses.
+    """
+    if not OPENAI_API_KEY:
+        raise LLMError("OpenAI API key is missing")
+
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+
+    headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+    payload = {"model": model, "messages": messages, "max_tokens": max_tokens, "stream": True}
+
+    async with get_semaphore():
+        try:
+            async with get_http_client().stream(
+                "POST",
+                OPENAI_API_URL,
+                json=payload,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            ) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    raise LLMError(f"OpenAI API Error: {response.status_code} - {body}")
+
+                # ✅ OpenAI streams Server-Sent Events: `data: {json}` lines, terminated by `data: [DONE]`
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.HTTPError as e:
+            raise LLMError(f"OpenAI stream failed: {type(e).__name__}: {e}") from e
+
+
+async def gemini_complete(prompt, system_prompt=None, max_tokens=None, model=GEMINI_MODEL, timeout=None):
+    """Send a generateContent request to Google Gemini and return the response text.
+
+    Same signature and error contract as `openai_complete`, so callers can swap providers.
+    """
+    if not GEMINI_API_KEY:
+        raise LLMError("Gemini API key is missing")
+
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if system_prompt:
+        payload["systemInstruction"] = {"parts": [{"text": system_prompt}]}
+    if max_tokens:
+        payload["generationConfig"] = {"maxOutputTokens": max_tokens}
+
+    headers = {"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY}
+    url = f"{GEMINI_API_BASE_URL}/{model}:generateContent"
+
+    async with get_semaphore():
+        try:
+            response = await get_http_client().post(
+                url,
+                json=payload,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+        except httpx.HTTPError as e:
+            raise LLMError(f"Gemini request failed: {type(e).__name__}: {e}") from e
+
+    if response.status_code != 200:
+        raise LLMError(f"Gemini API Error: {response.status_code} - {response.text}")
+
+    # Blocked or empty generations come back without candidates (or without parts)
+    try:
+        return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise LLMError(f"Unexpected Gemini response: {response.text}") from e
+
+
+# ✅ Provider registry: every provider shares the (prompt, system_prompt, max_tokens, model, timeout) interface
+PROVIDERS = {
+    "openai": openai_complete,
+    "gemini": gemini_complete,
+}
+
+# ✅ Providers that can stream: (prompt, system_prompt, max_tokens, model, timeout) -> async iterator of text deltas
+STREAM_PROVIDERS = {
+    "openai": openai_stream,
+}
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import time
+from collections import deque
+import numpy as np
+from config import OPENAI_API_KEY, GEMINI_API_KEY
+from llm_client import PROVIDERS, STREAM_PROVIDERS, LLMError
+
+# ✅ Multi-provider routing for completions.
+#
+#    Each call goes to the caller's preferred provider while it is healthy, otherwise to the
+#    fastest healthy one. If the first request is still running after that provider's
+#    LLM_HEDGE_PERCENTILE latency, a hedged request goes to the next provider and the first
+#    answer wins. A failed request falls through to the next provider, so callers only see
+#    an LLMError when every provider failed.
+#    Streams (`stream_route`) go to the preferred provider only while it is healthy, and their
+#    outcomes count toward its circuit breaker and latency history like any completion.
+LLM_ROUTER_PROVIDERS = [p.strip() for p in os.getenv("LLM_ROUTER_PROVIDERS", "openai,gemini").split(",") if p.strip()]
+LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "200"))                 # outcomes / latencies kept per provider
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "20"))         # before latency and error rate are trusted
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+LLM_ROUTER_FAILURE_THRESHOLD = int(os.getenv("LLM_ROUTER_FAILURE_THRESHOLD", "3"))  # consecutive errors that open the circuit
+LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv("LLM_ROUTER_COOLDOWN_SECONDS", "30"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_DEFAULT_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "5"))  # until enough latency samples exist
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.5"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))            # at most this share of requests hedged; 0 disables
+
+PROVIDER_API_KEYS = {"openai": OPENAI_API_KEY, "gemini": GEMINI_API_KEY}
+
+
+class ProviderHealth:
+    """Recent latency and error history of one provider."""
+
+    def __init__(self, name, window=LLM_ROUTER_WINDOW):
+        self.name = name
+        self.latencies = deque(maxlen=window)   # seconds; successes and lost hedge races
+        self.outcomes = deque(maxlen=window)    # True = success
+        self.consecutive_failures = 0
+        self.last_failure = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0  # lost a hedge race
+
+    def success(self, latency):
+        self.requests += 1
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+
+    def failure(self):
+        self.requests += 1
+        self.errors += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.last_failure = time.monotonic()
+
+    def latency_percentile(self, q):
+        if len(self.latencies) < LLM_ROUTER_MIN_SAMPLES:
+            return None
+        return float(np.percentile(self.latencies, q))
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def circuit_open(self):
+        return (self.consecutive_failures >= LLM_ROUTER_FAILURE_THRESHOLD
+                and time.monotonic() - self.last_failure < LLM_ROUTER_COOLDOWN_SECONDS)
+
+    def healthy(self):
+        if self.circuit_open():
+            return False
+        return len(self.outcomes) < LLM_ROUTER_MIN_SAMPLES or self.error_rate() <= LLM_ROUTER_MAX_ERROR_RATE
+
+    def hedge_delay(self):
+        latency = self.latency_percentile(LLM_HEDGE_PERCENTILE)
+        return max(LLM_HEDGE_MIN_SECONDS, latency if latency is not None else LLM_HEDGE_DEFAULT_SECONDS)
+
+    def stats(self):
+        def ms(q):
+            latency = self.latency_percentile(q)
+            return round(latency * 1000, 1) if latency is not None else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": ms(50),
+            "p95_ms": ms(95),
+            "p99_ms": ms(99),
+            "healthy": self.healthy(),
+            "circuit_open": self.circuit_open(),
+            "hedge_losses": self.cancelled,
+        }
+
+
+class LLMRouter:
+    def __init__(self, providers=LLM_ROUTER_PROVIDERS):
+        unknown = [p for p in providers if p not in PROVIDERS]
+        if unknown:
+            raise ValueError(f"Unknown LLM providers in LLM_ROUTER_PROVIDERS: {unknown}")
+        self.providers = list(providers)
+        self.health = {name: ProviderHealth(name) for name in self.providers}
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.served_by = {name: 0 for name in self.providers}
+        self.rerouted = 0  # preferred provider skipped because it was unhealthy
+
+    def order(self, preferred, exclude=()):
+        """Providers to try, best first: healthy before unhealthy, the preferred one first among
+        the healthy, the rest by median latency. Providers without an API key are left out."""
+        candidates = [p for p in self.providers if PROVIDER_API_KEYS.get(p) and p not in exclude]
+
+        def key(name):
+            health = self.health[name]
+            median = health.latency_percentile(50)
+            return (not health.healthy(), name != preferred, median if median is not None else LLM_HEDGE_DEFAULT_SECONDS)
+
+        return sorted(candidates, key=key)
+
+    def _may_hedge(self):
+        return self.hedges < LLM_HEDGE_MAX_RATIO * self.requests
+
+    async def _call(self, provider, prompt, kwargs):
+        health = self.health[provider]
+        start = time.perf_counter()
+        try:
+            result = await PROVIDERS[provider](prompt, **kwargs)
+        except asyncio.CancelledError:
+            # Lost a hedge race: keep the elapsed time as a (lower-bound) sample so slow
+            # calls still show up in the percentiles that set the hedge delay
+            health.cancelled += 1
+            health.latencies.append(time.perf_counter() - start)
+            raise
+        except LLMError:
+            health.failure()
+            raise
+        except Exception as e:
+            health.failure()
+            raise LLMError(f"{provider} returned an unusable response: {type(e).__name__}: {e}") from e
+        health.success(time.perf_counter() - start)
+        return result
+
+    async def complete(self, prompt, preferred="openai", exclude=(), **kwargs):
+        """Completion from the best available provider, hedged and with fallback.
+
+        `kwargs` (system_prompt, max_tokens, timeout) are passed to whichever provider runs.
+        Raises `LLMError` when every provider failed.
+        """
+        queue = self.order(preferred, exclude)
+        if not queue:
+            raise LLMError("No LLM provider is configured")
+        self.requests += 1
+        if preferred in self.health and queue[0] != preferred:
+            self.rerouted += 1
+
+        pending = {}  # task -> (provider, started, is_hedge)
+        errors = []
+        hedged = False
+
+        def launch(is_hedge=False):
+            provider = queue.pop(0)
+            task = asyncio.ensure_future(self._call(provider, prompt, kwargs))
+            pending[task] = (provider, time.perf_counter(), is_hedge)
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and queue and len(pending) == 1 and self._may_hedge():
+                    provider, started, _ = next(iter(pending.values()))
+                    timeout = max(0.0, self.health[provider].hedge_delay() - (time.perf_counter() - started))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # ✅ Slower than the provider's tail latency: race the next provider
+                    hedged = True
+                    self.hedges += 1
+                    launch(is_hedge=True)
+                    continue
+
+                for task in done:
+                    provider, _, is_hedge = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except LLMError as e:
+                        errors.append(f"{provider}: {str(e)}")
+                        continue
+                    self.served_by[provider] += 1
+                    if is_hedge:
+                        self.hedge_wins += 1
+                    return result
+
+                if not pending and queue:
+                    self.fallbacks += 1
+                    print(f"⚠️ LLM provider failed, falling back to {queue[0]}: {errors[-1]}")
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        self.failures += 1
+        raise LLMError("All LLM providers failed: " + "; ".join(errors))
+
+    async def stream(self, prompt, preferred="openai", **kwargs):
+        """Text deltas streamed from `preferred`, with its outcome recorded in the provider's health.
+
+        If `preferred` cannot stream, is unhealthy (circuit open) or fails before its first delta,
+        the answer comes from `complete` as a single delta. Raises `LLMError` when every provider
+        failed, or when the stream breaks after deltas were sent.
+        """
+        health = self.health.get(preferred)
+        if health is None or preferred not in STREAM_PROVIDERS or not PROVIDER_API_KEYS.get(preferred) or not health.healthy():
+            yield await self.complete(prompt, preferred=preferred, **kwargs)
+            return
+
+        started = time.perf_counter()
+        streamed = False
+        try:
+            async for delta in STREAM_PROVIDERS[preferred](prompt, **kwargs):
+                streamed = True
+                yield delta
+        except Exception as e:
+            health.failure()
+            error = e if isinstance(e, LLMError) else LLMError(f"{preferred} stream failed: {type(e).__name__}: {e}")
+            if streamed:
+                self.requests += 1
+                self.failures += 1
+                raise error from e
+        else:
+            self.requests += 1
+            self.served_by[preferred] += 1
+            health.success(time.perf_counter() - started)
+            return
+
+        self.fallbacks += 1
+        print(f"⚠️ LLM stream from {preferred} failed, falling back: {str(error)}")
+        yield await self.complete(prompt, preferred=None, exclude=(preferred,), **kwargs)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "served_by": dict(self.served_by),
+            "rerouted": self.rerouted,
+            "fallbacks": self.fallbacks,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failures": self.failures,
+            "providers": {name: health.stats() for name, health in self.health.items()},
+        }
+
+
+llm_router = LLMRouter()
+
+async def route(prompt, preferred="openai", exclude=(), **kwargs):
+    """Module-level entry point: `await route(prompt, preferred="gemini", system_prompt=..., max_tokens=...)`."""
+    return await llm_router.complete(prompt, preferred=preferred, exclude=exclude, **kwargs)
+
+def stream_route(prompt, preferred="openai", **kwargs):
+    """Module-level entry point for streaming: `async for delta in stream_route(prompt, system_prompt=...)`."""
+    return llm_router.stream(prompt, preferred=preferred, **kwargs)
+
+def llm_router_stats():
+    return llm_router.stats()
@@ -1,21 +1,33 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from routes.artifact import router as artifact_router
 from routes.contextual_chat import router as contextual_chat_router  # ✅ Import new route
 # from routes.flan_t5_inference import run_flan_t5_model  # ✅ Import Flan-T5 processing
-from ai_helpers import correct_spelling, detect_user_mood, get_llm_response, load_chat_history, save_chat_history
-from faiss_helper import search_faiss
+from ai_helpers import correct_spelling, detect_user_mood, get_llm_response
+from chat_store import DEFAULT_CONVERSATION_ID, load_chat_history, load_conversation, append_chat_turn, start_chat_store, close_chat_store, chat_store_stats
+from conversation_summary import schedule_summary_update, summary_stats
+from faiss_helper import start_background_load, retrieval_status, save_embedding_cache, query_cache_stats
+from prompt_builder import budget_sections, count_tokens
+from chat_pipeline import Stage, run_stages, PipelineStats
+from spell_corrector import start_background_build as build_spell_corrector
+from category_classifier import classify_message, category_classifier_stats
+from retrieval_executor import search_faiss_async, retrieval_executor_stats, shutdown_retrieval_executor
 from routes.tts import router as tts_router
-from routes.auth import auth_router, get_current_user
+from routes.auth import auth_router, get_current_user, get_optional_user
 from routes.profile_router import profile_router
+from routes.knowledge import router as knowledge_router
 from models import ChatRequest
-from db import init_db, seed_db, get_user_by_email, get_user_profile
+from llm_client import close_http_client, LLMError, ERROR_RESPONSE
+from llm_router import route, stream_route, llm_router_stats
+from response_cache import cached_completion, response_cache_stats
+from db import init_db, seed_db, init_db_pool, close_db_pool
+from async_db import init_async_db_pool, close_async_db_pool, get_user_by_email, get_user_profile, cache_stats
 import openai  # ✅ Import OpenAI
 import json
 import os
 from dotenv import load_dotenv
-import requests
 
 app = FastAPI()
 
@@ -43,9 +55,6 @@ openai.api_key = OPENAI_API_KEY
 
 # ✅ Paths to JSON files
 
-CHAT_HISTORY_FILE = "chat_history.json"
-
-
 USER_PROFILE_FILE = "user_profile.json"
 
 def load_user_profile():
@@ -58,9 +67,9 @@ def load_user_profile():
 
 # ✅ API Route: Retrieve Chat History
 @app.get("/chat-history")
-async def get_chat_history():
-    """Returns the stored chat history."""
-    return load_chat_history()
+async def get_chat_history(current_user: str = Depends(get_optional_user)):
+    """Returns the recent chat history of the signed-in user (or the shared anonymous conversation)."""
+    return await load_chat_history(current_user or DEFAULT_CONVERSATION_ID)
 
 # ✅ Query OpenAI GPT-4-turbo
 import openai
@@ -70,51 +79,30 @@ import json
 
 openai.api_key = OPENAI_API_KEY
 
-def categorize_message(message: str):
-    """Ask GPT to classify the user’s message into a predefined category."""
-    prompt = f"""
-    Classify the following user message into one of these categories:
-    - Running
-    - Nutrition
-    - Mindset
-    Respond with ONLY the category name, nothing else.
-
-    User message: {message}
-    """
-    response = query_openai_model(prompt)
-    return response.strip()  # Remove extra spaces/newlines
-
-def query_openai_model(prompt):
-    """Send the formatted prompt to OpenAI GPT-4-turbo and return the response."""
-    try:
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-        payload = {
-            "model": "gpt-4-turbo",
-            "messages": [
-                {"role": "system", "content": "You are a short, collaborative running coach. "
-                                              "Your responses must be under 50 words and always end with a follow-up question"},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 50
-        }
-
-        print("📨 Sending request to OpenAI:", json.dumps(payload, indent=2))  # ✅ Debugging request
-
-        response = requests.post("https://api.openai.com/v1/chat/completions", json=payload, headers=headers)
-
-        print(f"🔍 OpenAI API Response Code: {response.status_code}")  # ✅ Debugging response status
-        print(f"🔍 OpenAI API Response: {response.text}")  # ✅ Debugging response content
+COACH_SYSTEM_PROMPT = ("You are a short, collaborative running coach. "
+                       "Your responses must be under 50 words and always end with a follow-up question")
 
-        if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        else:
-            print(f"❌ OpenAI API Error: {response.status_code} - {response.text}")
-            return "Error: Unable to get response."
+async def query_openai_model(prompt, system_prompt=COACH_SYSTEM_PROMPT, cache_scope=None, cache_query=None, cache_context=None):
+    """Send the formatted prompt to GPT-4-turbo (or, if OpenAI is slow or failing, another provider) and return the response.
 
-    except Exception as e:
-        print(f"❌ Exception in OpenAI API call: {str(e)}")
-        return "Error: Unable to get response."
+    With a `cache_scope` (the user), responses go through the response cache. Passing the user's
+    question as `cache_query` and the stable inputs the answer depends on as `cache_context`
+    keys the cache on those instead of the whole prompt, and lets a rephrased question with
+    the same context reuse an earlier answer.
+    """
+    async def compute():
+        try:
+            return await route(prompt, preferred="openai", system_prompt=system_prompt, max_tokens=50)
+        except LLMError as e:
+            print(f"❌ {str(e)}")
+            return ERROR_RESPONSE
+
+    if cache_scope is None:
+        return await compute()
+    return await cached_completion(
+        compute, cache_scope, prompt, system_prompt, query=cache_query, context=cache_context,
+        cacheable=lambda response: response != ERROR_RESPONSE,
+    )
 
 
 # Make sure you have a startup event to initialize the database
@@ -122,45 +110,40 @@ def query_openai_model(prompt):
 async def app_startup():
     """Initialize the database on application startup."""
     print("🚀 Starting FastAPI Server")
+    # ✅ Embedding model + FAISS index load off the startup path; /health reports readiness
+    start_background_load()
+    build_spell_corrector()
+    start_chat_store()
+    try:
+        init_db_pool()
+    except Exception:
+        pass  # Logged in init_db_pool; the pool is retried lazily on first use
     init_db()
     seed_db()
-
-
-# ✅ API Route: Chat with OpenAI GPT-4
-@app.post("/chat")
-async def chat_with_gpt(chat_request: ChatRequest, current_user: str = Depends(get_current_user)):
-    # Get user by email (from JWT token)
-    user = get_user_by_email(current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get user profile from database
-    user_profile = get_user_profile(user['id'])
-    if not user_profile:
-        # Create default profile if none exists
-        user_profile = {
-            "email": current_user,
-            "name": user.get('name', ''),
-            "injury_history": [],
-            "nutrition": []
-        }
-    profile_text = json.dumps(user_profile, indent=2)
-    
-    # Rest of the function...
-    
-    # The rest of your function remains the same
-    chat_history = load_chat_history()
-    corrected_message = correct_spelling(chat_request.message)
-    mood = detect_user_mood(corrected_message)
-
-    # Retrieve relevant knowledge from FAISS
-    retrieved_contexts = search_faiss(corrected_message, top_k=3)
-    retrieved_text = "\n".join(retrieved_contexts) if retrieved_contexts else "No relevant data found."
-
-    # Format chat history for LLM
-    formatted_history = "\n".join(
-        [f"You: {entry['user']}\nGPT: {entry['bot']}" for entry in chat_history]
-    )
+    try:
+        await init_async_db_pool()
+    except Exception:
+        pass  # Logged in init_async_db_pool; the pool is retried lazily on first use
+
+
+@app.on_event("shutdown")
+async def app_shutdown():
+    """Release pooled LLM and database connections and the retrieval worker on shutdown."""
+    await close_http_client()
+    shutdown_retrieval_executor()
+    save_embedding_cache()
+    await close_chat_store()
+    await close_async_db_pool()
+    close_db_pool()
+
+
+def build_chat_prompt(user_profile, conversation, retrieved_contexts, corrected_message):
+    """Fill the coaching prompt with budgeted sections; returns (prompt, token breakdown)."""
+    summary, chat_history = conversation
+    sections, breakdown = budget_sections(user_profile, chat_history, retrieved_contexts, summary)
+    profile_text = sections["profile"]
+    formatted_history = sections["history"]
+    retrieved_text = sections["retrieval"] or "No relevant data found."
 
     # Construct full chat prompt
     full_prompt = f"""
@@ -180,30 +163,177 @@ async def chat_with_gpt(chat_request: ChatRequest, current_user: str = Depends(g
     {corrected_message}
 
     **TASK:**
-    1. Determine the category of the user's message: Running, Nutrition, or Mindset.
-    2. Based on the identified category and the provided context, generate a response that aligns with the user's journey.
+    Based on the provided context, generate a response that aligns with the user's journey.
+    """
+    breakdown["message"] = count_tokens(corrected_message)
+    breakdown["total"] = count_tokens(full_prompt)
+    return full_prompt, breakdown
+
+
+# ✅ Per-stage latency across /chat requests, reported by /metrics
+pipeline_stats = PipelineStats()
+
+def chat_prompt_stages(chat_request: ChatRequest, current_user: str):
+    """Stages that load the user's context and build the full coaching prompt.
 
-    **RESPONSE FORMAT:**
-    Category: [Identified Category]
-    [Your response here]
+    user -> profile, and spelling -> mood / retrieval -> category, run alongside the history
+    load; `prompt` joins them.
     """
+    async def user_stage(results):
+        # Get user by email (from JWT token)
+        user = await get_user_by_email(current_user)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user
+
+    async def profile_stage(results):
+        user = results["user"]
+        user_profile = await get_user_profile(user['id'])
+        if not user_profile:
+            # Create default profile if none exists
+            user_profile = {
+                "email": current_user,
+                "name": user.get('name', ''),
+                "injury_history": [],
+                "nutrition": []
+            }
+        return user_profile
+
+    async def history_stage(results):
+        # Rolling summary + the turns not yet folded into it
+        return await load_conversation(current_user)
+
+    async def retrieval_stage(results):
+        # Retrieve relevant knowledge from FAISS
+        return await search_faiss_async(results["spelling"], top_k=3, mode=chat_request.retrieval_mode)
+
+    def prompt_stage(results):
+        return build_chat_prompt(results["profile"], results["history"], results["retrieval"], results["spelling"])
+
+    return [
+        Stage("user", user_stage),
+        Stage("profile", profile_stage, deps=["user"]),
+        Stage("history", history_stage),
+        Stage("spelling", lambda results: correct_spelling(chat_request.message), blocking=True),
+        Stage("mood", lambda results: detect_user_mood(results["spelling"]), deps=["spelling"]),
+        Stage("retrieval", retrieval_stage, deps=["spelling"]),
+        # After retrieval so the message's embedding is already cached
+        Stage("category", lambda results: classify_message(results["spelling"]), deps=["retrieval"], blocking=True),
+        Stage("prompt", prompt_stage, deps=["profile", "history", "retrieval", "mood"]),
+    ]
+
+
+async def prepare_chat_prompt(chat_request: ChatRequest, current_user: str):
+    """Run the pre-LLM stages; returns (full_prompt, prompt token breakdown, category, timings)."""
+    stages = chat_prompt_stages(chat_request, current_user)
+    results, timings = await run_stages(stages)
+    pipeline_stats.record(timings, stages)
+    full_prompt, prompt_tokens = results["prompt"]
+    return full_prompt, prompt_tokens, results["category"], timings
 
-    # Call OpenAI GPT-4 API
-    response = query_openai_model(full_prompt)
 
-    # Parse the response to extract category and message
-    try:
-        category_line, bot_response = response.split('\n', 1)
-        category = category_line.replace('Category:', '').strip()
-    except ValueError:
-        category = "Unknown"
-        bot_response = response
+# ✅ API Route: Chat with OpenAI GPT-4
+@app.post("/chat")
+async def chat_with_gpt(chat_request: ChatRequest, response: Response, current_user: str = Depends(get_current_user)):
+    async def llm_stage(results):
+        # Call OpenAI GPT-4 API
+        full_prompt, _ = results["prompt"]
+        # Cache on the profile, the rolling summary, the question's category and the previous
+        # turn: short replies ("yes", "sure") answer the coach's last follow-up question, so the
+        # same words mean something else after a different turn. Older unsummarized turns are
+        # left out so a repeated exchange can still hit; retrieval follows the question.
+        summary, recent_turns = results["history"]
+        context = {
+            "profile": results["profile"],
+            "summary": summary,
+            "category": results["category"],
+            "last_turn": recent_turns[-1] if recent_turns else None,
+        }
+        return await query_openai_model(
+            full_prompt, cache_scope=current_user, cache_query=results["spelling"], cache_context=context
+        )
+
+    stages = chat_prompt_stages(chat_request, current_user) + [Stage("llm", llm_stage, deps=["prompt", "category"])]
+    results, timings = await run_stages(stages)
+    pipeline_stats.record(timings, stages)
+    response.headers["Server-Timing"] = timings.server_timing()
+    (_, chat_history), bot_response, category = results["history"], results["llm"], results["category"]
+    _, prompt_tokens = results["prompt"]
 
     # Save chat history
-    chat_history.append({"user": chat_request.message, "bot": bot_response})
-    save_chat_history(chat_history)
+    turn = {"user": chat_request.message, "bot": bot_response}
+    await append_chat_turn(current_user, turn)
+    schedule_summary_update(current_user)
+    chat_history.append(turn)
+
+    return {"category": category, "response": bot_response, "history": chat_history, "prompt_tokens": prompt_tokens}
+
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_chat_events(chat_request: ChatRequest, conversation_id, full_prompt, category, prompt_tokens=None):
+    """Emit the (locally classified) category, then relay GPT tokens as SSE.
+
+    The stream goes through the LLM router: if OpenAI is unhealthy or fails before the first
+    token, the answer comes from another provider as a single token event.
+    """
+    response_parts = []
+    yield format_sse("category", {"category": category})
+
+    try:
+        async for delta in stream_route(full_prompt, preferred="openai", system_prompt=COACH_SYSTEM_PROMPT, max_tokens=50):
+            response_parts.append(delta)
+            yield format_sse("token", {"text": delta})
+    except LLMError as e:
+        print(f"❌ {str(e)}")
+        yield format_sse("error", {"detail": ERROR_RESPONSE})
+        return
+
+    bot_response = "".join(response_parts)
+
+    # Save chat history once the full response is known
+    await append_chat_turn(conversation_id, {"user": chat_request.message, "bot": bot_response})
+    schedule_summary_update(conversation_id)
+
+    yield format_sse("done", {"category": category, "response": bot_response, "prompt_tokens": prompt_tokens})
+
+
+# ✅ API Route: Chat with OpenAI GPT-4, streamed as Server-Sent Events
+@app.post("/chat/stream")
+async def chat_with_gpt_stream(chat_request: ChatRequest, current_user: str = Depends(get_current_user)):
+    """Streaming variant of `/chat`: emits `category`, `token`, then `done` (or `error`) events."""
+    full_prompt, prompt_tokens, category, timings = await prepare_chat_prompt(chat_request, current_user)
+    return StreamingResponse(
+        stream_chat_events(chat_request, current_user, full_prompt, category, prompt_tokens),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": timings.server_timing()},
+    )
 
-    return {"category": category, "response": bot_response, "history": chat_history}
+@app.get("/health")
+async def health():
+    """Liveness plus readiness of the retrieval subsystem (still loading at cold start)."""
+    retrieval = retrieval_status()
+    return {
+        "status": "ok" if retrieval["ready"] else "degraded",
+        "retrieval": retrieval,
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime counters for the in-process caches and subsystems."""
+    return {
+        "db_cache": cache_stats(),
+        "retrieval_batching": retrieval_executor_stats(),
+        "query_cache": query_cache_stats(),
+        "chat_pipeline": pipeline_stats.stats(),
+        "chat_store": chat_store_stats(),
+        "conversation_summaries": summary_stats,
+        "response_cache": response_cache_stats(),
+        "categories": category_classifier_stats(),
+        "llm_router": llm_router_stats(),
+    }
 
 @app.get("/debug-db")
 async def debug_db():
@@ -267,6 +397,7 @@ app.include_router(contextual_chat_router)  # ✅ Register contextual chat endpo
 app.include_router(tts_router)  # ✅ Register TTS streaming endpoint
 app.include_router(auth_router, prefix="/auth")  # ✅ Register auth_router with prefix
 app.include_router(profile_router, prefix="/profile", tags=["Profile"])
+app.include_router(knowledge_router, tags=["Knowledge"])  # ✅ Incremental knowledge ingestion
 
 
 # ✅ Start the FastAPI server when running the script directly
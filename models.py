@@ -1,11 +1,12 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
 
 # Basic request model
 class ChatRequest(BaseModel):
     message: str
     email: Optional[str] = None  # Add this line
+    retrieval_mode: Optional[Literal["vector", "hybrid"]] = None  # None = server default (RETRIEVAL_MODE)
 
 # User profile model
 class UserProfileUpdate(BaseModel):
@@ -5,7 +5,8 @@ import openai
 import json
 import os
 from dotenv import load_dotenv
-import requests
+from llm_client import close_http_client, LLMError, ERROR_RESPONSE
+from llm_router import route
 
 # ✅ Initialize FastAPI App
 app = FastAPI()
@@ -73,33 +74,23 @@ def save_user_profile(profiles):
     with open(USER_PROFILE_FILE, "w") as f:
         json.dump(profiles, f, indent=2)
 
-# ✅ Query OpenAI API for Profile Setup
-def query_openai_model(prompt):
-    """Send a user message to OpenAI for profile setup assistance."""
-    try:
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-        payload = {
-            "model": "gpt-4-turbo",
-            "messages": [
-                {"role": "system", "content": "You are an AI assistant designed to help users complete their running profile. "
-                                              "Ask for missing information, confirm existing details, and guide them step by step. "
-                                              "Your responses must be under 50 words and always end with a follow-up question."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 50
-        }
+PROFILE_SYSTEM_PROMPT = ("You are an AI assistant designed to help users complete their running profile. "
+                         "Ask for missing information, confirm existing details, and guide them step by step. "
+                         "Your responses must be under 50 words and always end with a follow-up question.")
 
-        response = requests.post("https://api.openai.com/v1/chat/completions", json=payload, headers=headers)
+# ✅ Query the LLM router for Profile Setup
+async def query_openai_model(prompt):
+    """Send a user message to the LLM router (OpenAI preferred) for profile setup assistance."""
+    try:
+        return await route(prompt, preferred="openai", system_prompt=PROFILE_SYSTEM_PROMPT, max_tokens=50)
+    except LLMError as e:
+        print(f"❌ {str(e)}")
+        return ERROR_RESPONSE
 
-        if response.status_code == 200:
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        else:
-            print(f"❌ OpenAI API Error: {response.status_code} - {response.text}")
-            return "Error: Unable to get response."
-    except Exception as e:
-        print(f"❌ Exception in OpenAI API call: {str(e)}")
-        return "Error: Unable to get response."
+@app.on_event("shutdown")
+async def app_shutdown():
+    """Release pooled LLM connections on shutdown."""
+    await close_http_client()
 
 # ✅ API Route: Profile Chat
 @app.post("/profile-chat")
@@ -121,7 +112,7 @@ async def profile_chat(request: ProfileChatRequest):
     3. If the profile is complete, ask about training goals.
     """
 
-    response = query_openai_model(full_prompt)
+    response = await query_openai_model(full_prompt)
 
     return {
         "assistant_response": response,
@@ -0,0 +1,118 @@
+import json
+import os
+
+# ✅ Token-budgeted prompt sections. Each variable-size section (profile, history,
+#    retrieved knowledge) gets its own budget; the fixed instructions and the user's
+#    message are always sent in full.
+PROMPT_PROFILE_TOKENS = int(os.getenv("PROMPT_PROFILE_TOKENS", "150"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "600"))
+PROMPT_RETRIEVAL_TOKENS = int(os.getenv("PROMPT_RETRIEVAL_TOKENS", "400"))
+PROMPT_TOKENIZER_MODEL = os.getenv("PROMPT_TOKENIZER_MODEL", "gpt-4-turbo")
+# Fallback estimate when tiktoken is unavailable (English text averages ~4 chars/token)
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+
+def get_encoding():
+    """tiktoken encoding for the chat model, or None if tiktoken (or its BPE file) is unavailable."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.encoding_for_model(PROMPT_TOKENIZER_MODEL)
+        except Exception as e:
+            print(f"⚠️ tiktoken unavailable ({str(e)}); estimating tokens as chars / {CHARS_PER_TOKEN}")
+    return _encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text))
+
+def truncate_to_tokens(text, max_tokens):
+    """Longest prefix of `text` within `max_tokens`, cut at a word boundary and marked with '…'."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        prefix = text[:max_tokens * CHARS_PER_TOKEN - 1]
+    else:
+        prefix = encoding.decode(encoding.encode(text)[:max_tokens - 1])
+    cut = prefix.rfind(" ")
+    return (prefix[:cut] if cut > 0 else prefix).rstrip() + "…"
+
+def compact_profile(profile):
+    """Profile as compact JSON without empty fields; ids and email add nothing for the coach."""
+    fields = {
+        key: value for key, value in profile.items()
+        if value not in (None, "", [], {}) and key not in ("id", "user_id", "profile_id", "email")
+    }
+    return json.dumps(fields, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def format_turn(entry):
+    if "user" in entry:
+        return f"You: {entry['user']}\nGPT: {entry.get('bot', '')}"
+    return f"You: {entry.get('text', '')}"
+
+def fit_history(chat_history, budget):
+    """Newest turns that fit in `budget`, oldest first. Older turns are dropped first;
+    if even the newest turn is too long it is truncated rather than lost."""
+    kept = []
+    used = 0
+    for entry in reversed(chat_history):
+        text = format_turn(entry)
+        tokens = count_tokens(text) + 1  # newline separator
+        if used + tokens > budget:
+            if not kept:
+                text = truncate_to_tokens(text, budget)
+                kept.append(text)
+                used = count_tokens(text)
+            break
+        kept.append(text)
+        used += tokens
+    kept.reverse()
+    return "\n".join(kept), len(kept)
+
+def fit_snippets(snippets, budget):
+    """Retrieved snippets in rank order until the budget is spent; the last one may be truncated."""
+    kept = []
+    remaining = budget
+    for snippet in snippets:
+        tokens = count_tokens(snippet) + 1
+        if tokens > remaining:
+            partial = truncate_to_tokens(snippet, remaining - 1)
+            if partial:
+                kept.append(partial)
+            break
+        kept.append(snippet)
+        remaining -= tokens
+    return "\n".join(kept)
+
+def budget_sections(profile, chat_history, snippets, summary="",
+                    profile_budget=PROMPT_PROFILE_TOKENS, history_budget=PROMPT_HISTORY_TOKENS,
+                    retrieval_budget=PROMPT_RETRIEVAL_TOKENS):
+    """Fit profile, history and retrieved knowledge into their budgets.
+
+    A rolling `summary` of older turns is charged to the history budget first (at most half of it).
+    Returns (sections, breakdown): the section texts, and their token counts plus how
+    many history turns were kept or dropped.
+    """
+    profile_text = truncate_to_tokens(compact_profile(profile), profile_budget)
+    summary_text = truncate_to_tokens(summary, history_budget // 2) if summary else ""
+    history_text, kept_turns = fit_history(chat_history, history_budget - count_tokens(summary_text))
+    if summary_text:
+        history_text = f"Summary of earlier conversation: {summary_text}\n{history_text}".rstrip()
+    retrieved_text = fit_snippets(snippets, retrieval_budget)
+
+    sections = {"profile": profile_text, "history": history_text, "retrieval": retrieved_text}
+    breakdown = {name: count_tokens(text) for name, text in sections.items()}
+    breakdown["history_turns"] = kept_turns
+    breakdown["history_turns_dropped"] = len(chat_history) - kept_turns
+    breakdown["summary"] = count_tokens(summary_text)
+    return sections, breakdown
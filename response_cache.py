@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from collections import deque
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+import faiss_helper
+from embedding_cache import normalize_query
+from ttl_cache import TTLCache
+
+# ✅ LLM response cache, scoped per user.
+#
+#    Exact layer: when the caller names the user's question (`query`) and the inputs the
+#    answer depends on (`context`, e.g. profile + summary + previous turn), the key is the
+#    system prompt, the normalized question and the context; otherwise it is the system
+#    prompt and the prompt, verbatim. Only the question is normalized, so prompts that
+#    differ in case or wording elsewhere never share an entry.
+#    Semantic layer (with `query` and `context`): a new question whose MiniLM embedding is
+#    within RESPONSE_CACHE_SIMILARITY of an earlier one, asked with the same context,
+#    reuses that answer.
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))  # 0 disables
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92"))  # cosine; > 1 disables semantic hits
+RESPONSE_CACHE_SEMANTIC_CANDIDATES = int(os.getenv("RESPONSE_CACHE_SEMANTIC_CANDIDATES", "64"))  # per scope + context
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, maxsize=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS,
+                 similarity=RESPONSE_CACHE_SIMILARITY, candidates=RESPONSE_CACHE_SEMANTIC_CANDIDATES):
+        self.similarity = similarity
+        self.candidates = candidates
+        self._responses = TTLCache(maxsize, ttl)
+        # (scope, context digest) -> deque of (unit embedding, response key), newest last
+        self._semantic = TTLCache(maxsize, ttl)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _context_text(context):
+        return context if isinstance(context, str) else json.dumps(context, sort_keys=True, default=str)
+
+    @classmethod
+    def key(cls, scope, prompt, system_prompt="", query=None, context=None):
+        if query is not None and context is not None:
+            return (scope, _digest("query", system_prompt or "", normalize_query(query), cls._context_text(context)))
+        return (scope, _digest("prompt", system_prompt or "", prompt))
+
+    @classmethod
+    def context_key(cls, scope, context):
+        return (scope, _digest(cls._context_text(context)))
+
+    async def _embed(self, query):
+        # MiniLM is only used once retrieval has loaded it; encoding runs off the event loop
+        if self.similarity > 1 or not faiss_helper.is_ready():
+            return None
+        vector = (await run_in_threadpool(faiss_helper.encode_queries, [query]))[0]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def get(self, scope, prompt, system_prompt="", query=None, context=None):
+        """Cached response for this prompt (or a semantically equivalent one), else None.
+
+        Returns (response, embedding); pass the embedding back to `set` to avoid re-encoding.
+        """
+        response = self._responses.get(self.key(scope, prompt, system_prompt, query, context))
+        if response is not None:
+            self.exact_hits += 1
+            return response, None
+
+        embedding = None
+        if query is not None and context is not None:
+            embedding = await self._embed(query)
+            bucket = self._semantic.get(self.context_key(scope, context)) if embedding is not None else None
+            if bucket:
+                vectors = np.vstack([vector for vector, _ in bucket])
+                scores = vectors @ embedding
+                for i in np.argsort(-scores):
+                    if scores[i] < self.similarity:
+                        break
+                    response = self._responses.get(bucket[i][1])
+                    if response is not None:
+                        self.semantic_hits += 1
+                        return response, embedding
+
+        self.misses += 1
+        return None, embedding
+
+    def set(self, scope, prompt, response, system_prompt="", query=None, context=None, embedding=None):
+        key = self.key(scope, prompt, system_prompt, query, context)
+        self._responses.set(key, response)
+        if context is not None and embedding is not None:
+            context_key = self.context_key(scope, context)
+            bucket = self._semantic.get(context_key)
+            if bucket is None:
+                bucket = deque(maxlen=self.candidates)
+                self._semantic.set(context_key, bucket)
+            bucket.append((embedding, key))
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            "entries": len(self._responses),
+            "semantic_buckets": len(self._semantic),
+        }
+
+
+response_cache = ResponseCache() if RESPONSE_CACHE_MAX_ENTRIES > 0 else None
+
+async def cached_completion(compute, scope, prompt, system_prompt="", query=None, context=None, cacheable=None):
+    """Return `await compute()` through the response cache.
+
+    `cacheable(response)` decides whether a fresh response may be stored (e.g. not an error).
+    """
+    if response_cache is None:
+        return await compute()
+    response, embedding = await response_cache.get(scope, prompt, system_prompt, query, context)
+    if response is not None:
+        return response
+    response = await compute()
+    if cacheable is None or cacheable(response):
+        response_cache.set(scope, prompt, response, system_prompt, query, context, embedding)
+    return response
+
+def response_cache_stats():
+    return response_cache.stats() if response_cache is not None else {}
@@ -0,0 +1,115 @@
+import asyncio
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import faiss_helper
+
+# ✅ Micro-batching settings (override via environment)
+RETRIEVAL_BATCH_WINDOW_MS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "3"))
+RETRIEVAL_MAX_BATCH_SIZE = int(os.getenv("RETRIEVAL_MAX_BATCH_SIZE", "32"))
+RETRIEVAL_WORKER_THREADS = int(os.getenv("RETRIEVAL_WORKER_THREADS", "1"))
+
+
+class RetrievalBatcher:
+    """Collects concurrent searches for a few milliseconds and runs them as one batch.
+
+    Encoding and index search happen on a worker thread, so the event loop never runs
+    CPU-bound retrieval; each caller awaits its own future.
+    """
+
+    def __init__(self, search_batch, window_ms=RETRIEVAL_BATCH_WINDOW_MS,
+                 max_batch_size=RETRIEVAL_MAX_BATCH_SIZE, workers=RETRIEVAL_WORKER_THREADS):
+        self.search_batch = search_batch
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="retrieval")
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()  # the loop only holds weak references to running batches
+        self.batches = 0
+        self.queries = 0
+        self.max_batch_seen = 0
+
+    async def search(self, query, top_k=3, mode=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, top_k, mode, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        self.batches += 1
+        self.queries += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+        # Queries with different top_k values or retrieval modes cannot share one index search
+        by_settings = defaultdict(list)
+        for query, top_k, mode, future in batch:
+            by_settings[(top_k, mode)].append((query, future))
+
+        for (top_k, mode), items in by_settings.items():
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, partial(self.search_batch, mode=mode), [query for query, _ in items], top_k
+                )
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size_seen": self.max_batch_seen,
+            "window_ms": self.window_seconds * 1000.0,
+            "max_batch_size": self.max_batch_size,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_batcher = None
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        _batcher = RetrievalBatcher(faiss_helper.search_faiss_batch)
+    return _batcher
+
+async def search_faiss_async(query, top_k=3, mode=None):
+    """Non-blocking `search_faiss`: batched with concurrent callers and run off the event loop."""
+    return await get_batcher().search(query, top_k, mode)
+
+def retrieval_executor_stats():
+    return get_batcher().stats() if _batcher is not None else {}
+
+def shutdown_retrieval_executor():
+    global _batcher
+    if _batcher is not None:
+        _batcher.shutdown()
+        _batcher = None
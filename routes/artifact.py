@@ -5,13 +5,13 @@ import requests
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from ai_helpers import correct_spelling, detect_user_mood, enforce_focus, get_llm_response  # ✅ Keep existing AI functionality
+from chat_store import DEFAULT_CONVERSATION_ID, load_chat_history, append_chat_turn
 
 router = APIRouter()
 
 WORKFLOW_INDEX_FILE = "workflowIndex.yaml"
 WORKFLOW_FOLDER = "workflow/"
 ARTIFACT_FILE = "artifact.json"
-CHAT_HISTORY_FILE = "chat_history.json"
 
 # ✅ Load API Key for LLM
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -107,7 +107,7 @@ async def get_step(step_filename: str):
         return {"error": f"Step configuration file '{decoded_step_filename}' is missing."}
 
     artifact = load_artifact()
-    chat_history = load_chat_history()
+    chat_history = await load_chat_history(DEFAULT_CONVERSATION_ID)
 
     # Return two fields: 'filename' for the route, 'step_label' for the user-friendly name
     return {
@@ -170,11 +170,12 @@ async def post_step(step_filename: str, step_input: StepInput):
     save_artifact(artifact)
 
     # 4. Optionally handle chat_history or run LLM
-    chat_history = load_chat_history()
+    chat_history = await load_chat_history(DEFAULT_CONVERSATION_ID)
     # For example, append the user's message
-    chat_history.append({"role": "user", "text": step_input.response})
+    turn = {"role": "user", "text": step_input.response}
+    chat_history.append(turn)
     # Save it
-    save_chat_history(chat_history)
+    await append_chat_turn(DEFAULT_CONVERSATION_ID, turn)
 
     return {
         "message": "User input received and stored.",
@@ -193,24 +194,3 @@ def save_artifact(artifact):
     """Save artifact data to artifact.json."""
     with open(ARTIFACT_FILE, "w") as f:
         json.dump(artifact, f, indent=4)
-
-def load_chat_history():
-    """Load the last 10 chat messages from chat_history.json, or create an empty file if missing."""
-    if not os.path.exists(CHAT_HISTORY_FILE):
-        with open(CHAT_HISTORY_FILE, "w") as f:
-            json.dump([], f)
-        return []
-    
-    try:
-        with open(CHAT_HISTORY_FILE, "r") as f:
-            history = json.load(f)
-    except json.JSONDecodeError:
-        history = []
-        save_chat_history(history)  # ✅ Reset chat history if it's empty or corrupted
-
-    return history[-10:]  # ✅ Keep only the last 10 messages
-
-def save_chat_history(history):
-    """Save chat history to chat_history.json."""
-    with open(CHAT_HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=4)
\ No newline at end of file
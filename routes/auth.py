@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 import jwt
 from datetime import datetime, timedelta
-from config import SECRET_KEY
-from db import get_user_by_email, create_user
+from config import SECRET_KEY, ADMIN_EMAILS
+from async_db import get_user_by_email, create_user
 
 auth_router = APIRouter()
 
@@ -47,23 +47,35 @@ def get_current_user(authorization: str = Header(None)):
     token = authorization.split("Bearer ")[1]
     return decode_jwt_token(token)
 
+def get_optional_user(authorization: str = Header(None)):
+    """Like get_current_user, but anonymous requests get None instead of a 401."""
+    if authorization is None:
+        return None
+    return get_current_user(authorization)
+
+def get_admin_user(current_user: str = Depends(get_current_user)):
+    """Like get_current_user, but only for accounts listed in ADMIN_EMAILS; everyone else gets a 403."""
+    if current_user.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 @auth_router.post("/register")
-def register_user(user: UserRegister):
-    existing_user = get_user_by_email(user.email)
+async def register_user(user: UserRegister):
+    existing_user = await get_user_by_email(user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
-    user_id = create_user(user.name, user.email, user.password)
+    user_id = await create_user(user.name, user.email, user.password)
     if not user_id:
         raise HTTPException(status_code=500, detail="Failed to register user")
     return {"message": "User registered successfully"}
 
 @auth_router.post("/login")
-def login(user: UserLogin):
+async def login(user: UserLogin):
     try:
         print(f"Login attempt for: {user.email}")
         
         # Try to get user from database
-        db_user = get_user_by_email(user.email)
+        db_user = await get_user_by_email(user.email)
         print(f"Found user in DB: {db_user}")
         
         # If database lookup failed, check fallback users
@@ -92,5 +104,5 @@ def login(user: UserLogin):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @auth_router.get("/me")
-def get_user_details(current_user: str = Depends(get_current_user)):
+async def get_user_details(current_user: str = Depends(get_current_user)):
     return {"email": current_user}
\ No newline at end of file
@@ -1,39 +1,17 @@
-import json
-import os
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from ai_helpers import correct_spelling, detect_user_mood, get_llm_response  # ✅ Keep AI functionality
+from chat_store import DEFAULT_CONVERSATION_ID, load_chat_history
+from routes.auth import get_optional_user
 
 router = APIRouter()
 
-CHAT_HISTORY_FILE = "chat_history.json"
-
 class ChatInput(BaseModel):
     message: str
 
-def load_chat_history():
-    """Load the last 10 chat messages or create an empty file if missing."""
-    if not os.path.exists(CHAT_HISTORY_FILE):
-        with open(CHAT_HISTORY_FILE, "w") as f:
-            json.dump([], f)
-        return []
-    
-    try:
-        with open(CHAT_HISTORY_FILE, "r") as f:
-            history = json.load(f)
-    except json.JSONDecodeError:
-        history = []
-        save_chat_history(history)  # ✅ Reset chat history if it's corrupted
-
-    return history[-10:]  # ✅ Keep only the last 10 messages
-
-def save_chat_history(history):
-    """Save chat history to chat_history.json."""
-    with open(CHAT_HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=4)
-
 @router.post("/chat")
-async def chat_with_ai(chat_input: ChatInput):
+async def chat_with_ai(chat_input: ChatInput, current_user: str = Depends(get_optional_user)):
     """
     Process user input, apply AI corrections, and return an AI-generated response.
     """
@@ -43,15 +21,12 @@ async def chat_with_ai(chat_input: ChatInput):
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
 
     # ✅ Apply AI functions
-    corrected_message = correct_spelling(user_message)
+    corrected_message = await run_in_threadpool(correct_spelling, user_message)
     mood = detect_user_mood(corrected_message)
     
-    # ✅ Generate AI response
-    ai_response = get_llm_response(corrected_message)
-
-    # ✅ Load and update chat history
-    chat_history = load_chat_history()
-    chat_history.append({"user": user_message, "bot": ai_response})
-    save_chat_history(chat_history)
+    # ✅ Generate AI response (get_llm_response records the turn)
+    conversation_id = current_user or DEFAULT_CONVERSATION_ID
+    ai_response = await get_llm_response(corrected_message, conversation_id)
+    chat_history = await load_chat_history(conversation_id)
 
     return {"response": ai_response, "history": chat_history}
\ No newline at end of file
@@ -1,22 +1,23 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from ai_helpers import correct_spelling, detect_user_mood, get_llm_response, load_chat_history, save_chat_history
-import requests
-import os
+from ai_helpers import correct_spelling, detect_user_mood, get_llm_response
+from chat_store import DEFAULT_CONVERSATION_ID, load_chat_history, append_chat_turn
+from llm_client import LLMError
+from llm_router import route
+from routes.auth import get_optional_user
 
 router = APIRouter()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-pro:generateContent"
-
 class ChatRequest(BaseModel):
     message: str
 
 @router.post("/chat/contextual")
-async def chat_with_context(chat_request: ChatRequest):
+async def chat_with_context(chat_request: ChatRequest, current_user: str = Depends(get_optional_user)):
     """Chat with historical context included in the prompt."""
-    chat_history = load_chat_history()
-    corrected_message = correct_spelling(chat_request.message)
+    conversation_id = current_user or DEFAULT_CONVERSATION_ID
+    chat_history = await load_chat_history(conversation_id)
+    corrected_message = await run_in_threadpool(correct_spelling, chat_request.message)
 
     # ✅ Format chat history for LLM
     formatted_history = "\n".join(
@@ -26,21 +27,15 @@ async def chat_with_context(chat_request: ChatRequest):
     # ✅ Add the latest user message
     full_prompt = f"{formatted_history}\nYou: {chat_request.message}\nGPT:"
 
-    payload = {
-        "contents": [{"parts": [{"text": full_prompt}]}]
-    }
-
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(f"{GEMINI_API_URL}?key={GEMINI_API_KEY}", json=payload, headers=headers)
-
-    if response.status_code != 200:
-        raise HTTPException(status_code=500, detail="Error communicating with Google Gemini API")
-
-    response_data = response.json()
-    gpt_response = response_data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "No response received")
+    try:
+        gpt_response = await route(full_prompt, preferred="gemini")
+    except LLMError as e:
+        print(f"❌ {str(e)}")
+        raise HTTPException(status_code=500, detail="Error communicating with the LLM providers")
 
     # ✅ Save chat history
-    chat_history.append({"user": chat_request.message, "bot": gpt_response})
-    save_chat_history(chat_history)
+    turn = {"user": chat_request.message, "bot": gpt_response}
+    await append_chat_turn(conversation_id, turn)
+    chat_history.append(turn)
 
     return {"response": gpt_response, "history": chat_history}
\ No newline at end of file
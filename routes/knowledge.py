@@ -0,0 +1,34 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from routes.auth import get_admin_user
+from ingest_knowledge import ingest_documents
+import faiss_helper
+
+router = APIRouter()
+
+class KnowledgeDocument(BaseModel):
+    text: str
+    doc_id: Optional[str] = None
+    topic_path: str = "unknown_topic"
+    chunk_type: str = "example"
+
+class IngestRequest(BaseModel):
+    documents: List[KnowledgeDocument]
+
+@router.post("/knowledge/ingest")
+async def ingest_knowledge(request: IngestRequest, current_user: str = Depends(get_admin_user)):
+    """Append documents to the knowledge index and hot-swap it into the running app.
+
+    The knowledge base feeds every user's prompt, so only ADMIN_EMAILS accounts may write to it.
+    """
+    documents = [document.dict() for document in request.documents]
+    try:
+        # ✅ Encoding and index writes are blocking; keep them off the event loop
+        result = await run_in_threadpool(ingest_documents, documents)
+        if result["chunks_added"] and faiss_helper.is_ready():
+            await run_in_threadpool(faiss_helper.reload_index)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return result
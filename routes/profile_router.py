@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import date
-from db import get_user_profile, save_user_profile, get_user_by_email
+from async_db import get_user_profile, save_user_profile, get_user_by_email
 from models import ChatRequest, UserProfileUpdate
 import json
 
@@ -27,15 +27,15 @@ class UserProfileUpdate(BaseModel):
     last_check_in: Optional[date] = None
 
 @profile_router.get("/profile")
-def get_profile(current_user: str = Depends(get_current_user)):
+async def get_profile(current_user: str = Depends(get_current_user)):
     """Get the current user's profile."""
     # Get user ID from email
-    user = get_user_by_email(current_user)
+    user = await get_user_by_email(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get the user's profile
-    profile = get_user_profile(user['id'])
+    profile = await get_user_profile(user['id'])
     if not profile:
         # Return a basic profile if none exists
         return {
@@ -48,10 +48,10 @@ def get_profile(current_user: str = Depends(get_current_user)):
     return profile
 
 @profile_router.put("/profile")
-def update_profile(profile_data: UserProfileUpdate, current_user: str = Depends(get_current_user)):
+async def update_profile(profile_data: UserProfileUpdate, current_user: str = Depends(get_current_user)):
     """Update the current user's profile."""
     # Get user ID from email
-    user = get_user_by_email(current_user)
+    user = await get_user_by_email(current_user)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -59,12 +59,12 @@ def update_profile(profile_data: UserProfileUpdate, current_user: str = Depends(
     profile_dict = {k: v for k, v in profile_data.dict().items() if v is not None}
     
     # Save the profile
-    success = save_user_profile(user['id'], profile_dict)
+    success = await save_user_profile(user['id'], profile_dict)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update profile")
     
     # Get the updated profile
-    updated_profile = get_user_profile(user['id'])
+    updated_profile = await get_user_profile(user['id'])
     return updated_profile
 
 @profile_router.post("/profile-chat")
@@ -74,12 +74,12 @@ async def profile_chat(request: ChatRequest, current_user: str = Depends(get_cur
     """
     try:
         # Get user profile using the authenticated user's email
-        user = get_user_by_email(current_user)
+        user = await get_user_by_email(current_user)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Get user profile from database
-        profile_data = get_user_profile(user['id'])
+        profile_data = await get_user_profile(user['id'])
         if not profile_data:
             # Create default profile if none exists
             profile_data = {
@@ -132,7 +132,9 @@ async def profile_chat(request: ChatRequest, current_user: str = Depends(get_cur
         
         # You'll need to import the query_openai_model function from main.py
         from main import query_openai_model
-        response = query_openai_model(full_prompt)
+        response = await query_openai_model(
+            full_prompt, cache_scope=current_user, cache_query=request.message, cache_context=profile_data
+        )
         
         return {
             "response": response,
@@ -0,0 +1,200 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+# ✅ Symmetric-delete (SymSpell-style) spelling corrector.
+#
+#    Every dictionary word is indexed under all strings reachable by deleting up to
+#    MAX_EDIT_DISTANCE characters from its first PREFIX_LENGTH characters. A misspelled
+#    token only generates its own deletes and looks them up, instead of the ~54n + 25
+#    edit-1 (and their edit-2) candidates TextBlob builds per word, then the few
+#    candidates are verified with an exact edit distance.
+#
+#    Choice rule matches TextBlob's `correct()`: known words are kept, otherwise the most
+#    frequent word at the smallest edit distance (1, then 2) wins; title case is preserved.
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+SPELLING_MEMO_SIZE = int(os.getenv("SPELLING_MEMO_SIZE", "50000"))
+
+# Running vocabulary the general-English word list lacks or would "correct" away.
+# Added at a high count so these win ties and are never rewritten.
+DOMAIN_VOCABULARY = (
+    "vo2 vo2max tempo fartlek strides intervals threshold lactate cadence negative splits "
+    "taper tapering mileage km kms mi 5k 10k 15k 8k halfmarathon marathon ultramarathon ultra "
+    "parkrun trail hilly hills pr prs pb pbs bq boston chicago berlin london tokyo nyc "
+    "comrades ironman triathlon duathlon rpe hrv bpm hr zone2 z2 aerobic anaerobic "
+    "pace paces splits min mile miles kilometer kilometers itb it band plantar fasciitis "
+    "achilles shin splints hamstring hamstrings quad quads glute glutes calf calves "
+    "garmin strava coros polar gels electrolytes carb carbs carbo loading hydration "
+    "recovery crosstraining foam roller warmup cooldown drills plyometrics "
+    "workout workouts speedwork treadmill longrun runs runner runners jog jogging jogged "
+    "sore soreness stretching rehab physio squats lunges deadlifts yoga pilates "
+    # Chat spellings: dropped apostrophes, short forms and fillers
+    "im ive ill id dont doesnt didnt cant wont isnt wasnt arent havent hasnt shouldnt "
+    "wouldnt couldnt thats whats theres lets youre theyre ok okay yeah yep nope hey hi "
+    "thx thanks lol btw tbh gonna wanna gotta kinda"
+).split()
+DOMAIN_WORD_COUNT = 10000
+
+# Common chat misspellings whose nearest dictionary word is the wrong one
+# (e.g. "mils" is one edit from both "mile" and "miles")
+DOMAIN_CORRECTIONS = {
+    "mils": "miles",
+    "milage": "mileage",
+    "excercise": "exercise",
+    "excercises": "exercises",
+}
+
+_TOKEN = re.compile(r"\w+|[^\w\s]|\s+")
+
+
+def textblob_frequency_file():
+    """Path of the word frequency list shipped with TextBlob (the corpus its corrector uses)."""
+    import textblob
+
+    return os.path.join(os.path.dirname(textblob.__file__), "en", "en-spelling.txt")
+
+
+def osa_distance(a, b, max_distance):
+    """Optimal string alignment distance (adjacent transpositions cost 1), or max_distance + 1 if larger."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+def _deletes(word, max_distance):
+    """All strings obtained by deleting up to `max_distance` characters (including `word` itself)."""
+    results = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+class SpellCorrector:
+    def __init__(self, max_edit_distance=MAX_EDIT_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.counts = {}
+        self._deletes = {}  # delete string -> tuple of dictionary words
+
+    def add_word(self, word, count):
+        word = word.lower()
+        if word in self.counts:
+            self.counts[word] = max(self.counts[word], count)
+            return
+        self.counts[word] = count
+        for delete in _deletes(word[:self.prefix_length], self.max_edit_distance):
+            self._deletes[delete] = self._deletes.get(delete, ()) + (word,)
+
+    def load_frequency_file(self, path):
+        """Load "word count" lines; lines starting with ';;;' are comments."""
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and not line.startswith(";;;"):
+                    self.add_word(parts[0], int(parts[1]))
+
+    def lookup(self, word):
+        """Best correction for a single lowercase word (the word itself if known or uncorrectable)."""
+        if word in DOMAIN_CORRECTIONS:
+            return DOMAIN_CORRECTIONS[word]
+        if word in self.counts:
+            return word
+        best, best_distance, best_count = word, self.max_edit_distance + 1, -1
+        seen = set()
+        for delete in _deletes(word[:self.prefix_length], self.max_edit_distance):
+            for candidate in self._deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = osa_distance(word, candidate, self.max_edit_distance)
+                count = self.counts[candidate]
+                # Smaller distance first, then higher frequency, then (like TextBlob) the later word
+                if (distance, -count, _reverse_key(candidate)) < (best_distance, -best_count, _reverse_key(best)):
+                    best, best_distance, best_count = candidate, distance, count
+        return best if best_distance <= self.max_edit_distance else word
+
+    def correct_token(self, token):
+        if len(token) == 1 or not token.isalpha():
+            return token  # punctuation, whitespace, numbers, paces like "7" / "30", "5k"
+        corrected = self.lookup(token.lower())
+        if corrected == token.lower():
+            return token
+        return corrected.title() if token.istitle() else corrected
+
+    def correct(self, text):
+        return "".join(self.correct_token(token) for token in _TOKEN.findall(text))
+
+
+def _reverse_key(word):
+    # Orders words descending under an ascending comparison
+    return tuple(-ord(c) for c in word)
+
+
+_corrector = None
+_corrector_lock = threading.Lock()  # held only to publish a finished build
+_build_lock = threading.Lock()      # held only to start the background build thread
+_build_thread = None
+
+def _build_corrector():
+    corrector = SpellCorrector()
+    corrector.load_frequency_file(textblob_frequency_file())
+    for word in DOMAIN_VOCABULARY:
+        corrector.add_word(word, DOMAIN_WORD_COUNT)
+    return corrector
+
+def get_spell_corrector():
+    """The shared corrector, built on first use from TextBlob's word list plus the domain vocabulary.
+
+    The build runs without holding a lock, so nothing waits on it but the caller.
+    """
+    global _corrector
+    if _corrector is None:
+        corrector = _build_corrector()
+        with _corrector_lock:
+            if _corrector is None:
+                _corrector = corrector
+    return _corrector
+
+
+def start_background_build():
+    """Build the corrector's delete index (~2-3 s) on a daemon thread at startup."""
+    global _build_thread
+    with _build_lock:
+        if _corrector is not None or (_build_thread is not None and _build_thread.is_alive()):
+            return
+        _build_thread = threading.Thread(target=get_spell_corrector, name="spell-corrector", daemon=True)
+        _build_thread.start()
+
+
+def is_ready():
+    return _corrector is not None
+
+
+@lru_cache(maxsize=SPELLING_MEMO_SIZE)
+def correct_token(token):
+    """Memoized per-token correction; chat messages repeat most of their words."""
+    return get_spell_corrector().correct_token(token)
+
+
+def correct_text(text):
+    """Corrected `text`; returned unchanged (never blocking on the ~2-3 s build) until the corrector is ready."""
+    if not is_ready():
+        start_background_build()
+        return text
+    return "".join(correct_token(token) for token in _TOKEN.findall(text))
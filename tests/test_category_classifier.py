@@ -0,0 +1,26 @@
+import pytest
+from category_classifier import keyword_category, topic_category
+
+
+@pytest.mark.parametrize("text", [
+    "That was a great run",
+    "My angel of a coach paced me",
+    "Is there a toilet at the start line?",
+])
+def test_keywords_do_not_match_inside_other_words(text):
+    assert keyword_category(text) is None
+
+
+@pytest.mark.parametrize("text, category", [
+    ("What should I eat before a long run?", "Nutrition"),
+    ("How many gels per hour?", "Nutrition"),
+    ("I stay hydrated with electrolytes", "Nutrition"),
+    ("I lose motivation after week three", "Mindset"),
+])
+def test_keywords_match_whole_words_and_stems(text, category):
+    assert keyword_category(text) == category
+
+
+def test_topic_paths_split_on_underscores():
+    assert topic_category("training > pre_race_diet") == "Nutrition"
+    assert topic_category("training > tapering") == "Running"
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import pytest
+import chat_store
+from chat_store import JsonlChatStore
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_fsync_errors_reach_appends_after_bounded_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_store, "CHAT_LOG_FSYNC_WINDOW_MS", 0)
+    attempts = []
+
+    def failing_fsync(fd):
+        attempts.append(fd)
+        raise OSError(5, "Input/output error")
+
+    async def scenario():
+        store = JsonlChatStore(str(tmp_path))
+        store.open()
+        monkeypatch.setattr(os, "fsync", failing_fsync)
+        with pytest.raises(OSError):
+            await asyncio.wait_for(store.append("ana", {"user": "hi", "bot": "hello"}), timeout=5)
+        monkeypatch.undo()
+        await store.close()
+        return store
+
+    store = run(scenario())
+    assert len(attempts) == chat_store.CHAT_LOG_FSYNC_MAX_ATTEMPTS
+    assert store.fsync_errors == chat_store.CHAT_LOG_FSYNC_MAX_ATTEMPTS
+
+
+def test_rotated_segments_are_synced_by_the_group_commit(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_store, "CHAT_LOG_FSYNC_WINDOW_MS", 0)
+    monkeypatch.setattr(chat_store, "CHAT_LOG_SEGMENT_BYTES", 1)
+
+    async def scenario():
+        store = JsonlChatStore(str(tmp_path))
+        store.open()
+        for turn in range(3):
+            await store.append("ana", {"user": f"q{turn}", "bot": f"a{turn}"})
+        assert store._sealed_files == []
+        await store.close()
+
+    run(scenario())
+    reopened = JsonlChatStore(str(tmp_path))
+    turns = run(reopened.recent("ana", 10))
+    assert [entry["user"] for _, entry in turns] == ["q0", "q1", "q2"]
+
+
+def test_windows_past_the_ring_buffer_are_read_from_the_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat_store, "CHAT_LOG_FSYNC_WINDOW_MS", 0)
+    monkeypatch.setattr(chat_store, "CHAT_LOG_TAIL_TURNS", 5)
+
+    async def scenario():
+        store = JsonlChatStore(str(tmp_path))
+        store.open()
+        for turn in range(12):
+            await store.append("ana", {"user": f"q{turn}"})
+        await store.append("ben", {"user": "other"})
+        in_buffer = await store.recent("ana", 3)
+        folded = await store.recent("ana", 6, offset=4)
+        await store.close()
+        return in_buffer, folded
+
+    in_buffer, folded = run(scenario())
+    assert [entry["user"] for _, entry in in_buffer] == ["q9", "q10", "q11"]
+    assert [entry["user"] for _, entry in folded] == ["q2", "q3", "q4", "q5", "q6", "q7"]
+
+
+def test_second_writer_is_refused(tmp_path):
+    async def scenario():
+        first = JsonlChatStore(str(tmp_path))
+        first.open()
+        with pytest.raises(RuntimeError):
+            JsonlChatStore(str(tmp_path)).open()
+        await first.close()
+        second = JsonlChatStore(str(tmp_path))
+        second.open()  # the lock is released on close
+        await second.close()
+
+    run(scenario())
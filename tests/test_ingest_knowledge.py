@@ -0,0 +1,60 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+import pytest
+import faiss_helper
+import ingest_knowledge
+
+REPO = os.path.join(os.path.dirname(__file__), "..")
+
+
+class HashModel:
+    """Deterministic stand-in for MiniLM: one seeded random vector per text."""
+
+    def get_sentence_embedding_dimension(self):
+        return 384
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True):
+        return np.stack([
+            np.random.default_rng(int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)).standard_normal(384)
+            for text in texts
+        ]).astype(np.float32)
+
+
+@pytest.fixture
+def knowledge_dir(tmp_path, monkeypatch):
+    for name in (faiss_helper.FLAT_INDEX_FILE, faiss_helper.METADATA_FILE):
+        shutil.copy(os.path.join(REPO, name), tmp_path / name)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_ingestion_appends_segments_without_rewriting_base_files(knowledge_dir):
+    base_files = [faiss_helper.FLAT_INDEX_FILE, faiss_helper.METADATA_FILE]
+    before = [os.stat(name).st_mtime_ns for name in base_files]
+    model = HashModel()
+
+    first = ingest_knowledge.ingest_documents([{"doc_id": "taper", "text": "Taper for two weeks. Cut volume by half."}], model=model)
+    second = ingest_knowledge.ingest_documents([{"doc_id": "taper", "text": "again"}, {"doc_id": "fuel", "text": "Eat carbs."}], model=model)
+
+    assert [os.stat(name).st_mtime_ns for name in base_files] == before
+    assert (first["chunks_added"], second["documents_skipped"], second["first_row"]) == (2, 1, first["first_row"] + 2)
+
+    index = faiss_helper.load_faiss_index()
+    metadata = faiss_helper.load_metadata()
+    assert index.ntotal == len(metadata) == second["first_row"] + 1
+    assert metadata[-1]["doc_id"] == "fuel"
+
+
+def test_segmented_search_matches_one_flat_index(knowledge_dir):
+    import faiss
+
+    model = HashModel()
+    ingest_knowledge.ingest_documents([{"doc_id": "taper", "text": "Taper for two weeks. Cut volume by half."}], model=model)
+    index = faiss_helper.load_faiss_index()
+    exact = faiss.IndexFlatL2(index.d)
+    exact.add(faiss_helper.load_flat_index().reconstruct_n(0, index.ntotal))
+
+    queries = model.encode(["Cut volume by half.", "Taper for two weeks."])
+    assert np.array_equal(index.search(queries, 5)[1], exact.search(queries, 5)[1])
@@ -0,0 +1,19 @@
+import asyncio
+import httpx
+import pytest
+import llm_client
+from llm_client import LLMError
+
+
+@pytest.mark.parametrize("body", [
+    {"candidates": []},
+    {"promptFeedback": {"blockReason": "SAFETY"}},
+    {"candidates": [{"finishReason": "SAFETY"}]},
+])
+def test_gemini_empty_candidates_raise_llm_error(monkeypatch, body):
+    monkeypatch.setattr(llm_client, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_client, "_http_client", httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=body))
+    ))
+    with pytest.raises(LLMError):
+        asyncio.run(llm_client.gemini_complete("How far should I run?"))
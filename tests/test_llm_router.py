@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+import llm_router
+from llm_client import LLMError
+from llm_router import LLMRouter
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def collect(router, prompt):
+    async def scenario():
+        return [delta async for delta in router.stream(prompt, preferred="openai")]
+    return run(scenario())
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(llm_router, "PROVIDER_API_KEYS", {"openai": "test-key", "gemini": "test-key"})
+    calls = {"stream": 0}
+
+    async def gemini(prompt, **kwargs):
+        return "from gemini"
+
+    async def broken_stream(prompt, **kwargs):
+        calls["stream"] += 1
+        raise LLMError("openai is down")
+        yield
+
+    monkeypatch.setattr(llm_router, "PROVIDERS", {"openai": gemini, "gemini": gemini})
+    monkeypatch.setattr(llm_router, "STREAM_PROVIDERS", {"openai": broken_stream})
+    router = LLMRouter(providers=["openai", "gemini"])
+    router.calls = calls
+    return router
+
+
+def test_stream_failures_open_the_circuit(router):
+    for _ in range(llm_router.LLM_ROUTER_FAILURE_THRESHOLD):
+        assert collect(router, "hi") == ["from gemini"]
+    assert router.health["openai"].circuit_open()
+    assert router.calls["stream"] == llm_router.LLM_ROUTER_FAILURE_THRESHOLD
+
+    # ✅ Circuit open: the stream is not attempted at all
+    assert collect(router, "hi") == ["from gemini"]
+    assert router.calls["stream"] == llm_router.LLM_ROUTER_FAILURE_THRESHOLD
+    assert router.stats()["fallbacks"] == llm_router.LLM_ROUTER_FAILURE_THRESHOLD
+
+
+def test_stream_success_is_recorded(router, monkeypatch):
+    async def stream(prompt, **kwargs):
+        yield "10"
+        yield "k"
+
+    monkeypatch.setattr(llm_router, "STREAM_PROVIDERS", {"openai": stream})
+    assert collect(router, "hi") == ["10", "k"]
+    assert router.health["openai"].requests == 1
+    assert router.served_by["openai"] == 1
@@ -0,0 +1,40 @@
+import asyncio
+from response_cache import ResponseCache
+
+CONTEXT = {"profile": {"name": "Ana"}, "summary": "", "category": "Running", "last_turn": None}
+AFTER_NUTRITION = dict(CONTEXT, category="Nutrition", last_turn={
+    "user": "What should I eat before a long run?", "bot": "Oats and a banana work well. Want a gel plan too?"})
+AFTER_INTERVALS = dict(CONTEXT, last_turn={
+    "user": "How do I get faster?", "bot": "Try 6 x 800m intervals once a week. Shall we schedule them?"})
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_short_replies_depend_on_the_previous_turn():
+    cache = ResponseCache(maxsize=10, ttl=60, similarity=2)
+    cache.set("ana", "prompt 1", "Great, 30g of carbs per hour.", "coach", "yes", AFTER_NUTRITION)
+    assert run(cache.get("ana", "prompt 2", "coach", "yes", AFTER_INTERVALS))[0] is None
+    assert cache.stats()["exact_hits"] == 0
+
+
+def test_repeated_exchange_hits_despite_different_prompts():
+    cache = ResponseCache(maxsize=10, ttl=60, similarity=2)
+    cache.set("ana", "history: turn 1\nHow far should I run?", "10k", "coach", "How far should I run?", AFTER_INTERVALS)
+    response, _ = run(cache.get("ana", "history: turn 2\nhow far should I run", "coach", "how far should I run", AFTER_INTERVALS))
+    assert response == "10k"
+
+
+def test_context_and_user_scope_separate_entries():
+    cache = ResponseCache(maxsize=10, ttl=60, similarity=2)
+    cache.set("ana", "p", "10k", "coach", "How far should I run?", CONTEXT)
+    assert run(cache.get("ana", "p", "coach", "How far should I run?", dict(CONTEXT, summary="injured")))[0] is None
+    assert run(cache.get("ben", "p", "coach", "How far should I run?", CONTEXT))[0] is None
+
+
+def test_plain_prompts_are_not_case_folded():
+    cache = ResponseCache(maxsize=10, ttl=60, similarity=2)
+    cache.set("ana", "Reply with the word YES", "YES", "coach")
+    assert run(cache.get("ana", "reply with the word yes", "coach"))[0] is None
+    assert run(cache.get("ana", "Reply with the word YES", "coach"))[0] == "YES"
@@ -0,0 +1,29 @@
+import asyncio
+import gc
+import threading
+from retrieval_executor import RetrievalBatcher
+
+
+def test_batches_in_flight_are_kept_alive():
+    release = threading.Event()
+
+    def search_batch(queries, top_k, mode=None):
+        release.wait(5)
+        return [f"{query}:{top_k}" for query in queries]
+
+    async def scenario():
+        batcher = RetrievalBatcher(search_batch, window_ms=1)
+        searches = [asyncio.ensure_future(batcher.search(f"q{i}")) for i in range(3)]
+        await asyncio.sleep(0.05)
+        in_flight = len(batcher._tasks)  # referenced while it waits on the worker thread
+        gc.collect()
+        release.set()
+        results = await asyncio.wait_for(asyncio.gather(*searches), timeout=5)
+        await asyncio.sleep(0)
+        batcher.shutdown()
+        return in_flight, results, batcher._tasks
+
+    in_flight, results, tasks = asyncio.run(scenario())
+    assert in_flight == 1
+    assert results == ["q0:3", "q1:3", "q2:3"]
+    assert not tasks
@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+import time
+import pytest
+import spell_corrector
+
+CHAT_HISTORY_FILE = os.path.join(os.path.dirname(__file__), "..", "chat_history.json")
+
+
+@pytest.fixture(scope="module")
+def corrector():
+    return spell_corrector.get_spell_corrector()
+
+
+def test_real_chat_messages_are_left_alone(corrector):
+    with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
+        messages = [entry["user"] for entry in json.load(f) if entry.get("user")]
+    assert messages
+    for message in messages:
+        assert corrector.correct(message) == message
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("What should I do for my speed workout today?", "What should I do for my speed workout today?"),
+    ("Im sore after my long run", "Im sore after my long run"),
+    ("dont think I can do intervals", "dont think I can do intervals"),
+    ("I ran 5 mils yesterday", "I ran 5 miles yesterday"),
+    ("My milage is up this week", "My mileage is up this week"),
+    ("Training for a marathn", "Training for a marathon"),
+    ("My hamstrng hurts", "My hamstring hurts"),
+])
+def test_chat_spellings(corrector, message, expected):
+    assert corrector.correct(message) == expected
+
+
+class _InstantCorrector:
+    def correct_token(self, token):
+        return "marathon" if token == "marathn" else token
+
+
+def test_requests_never_wait_for_the_build(monkeypatch):
+    release = threading.Event()
+
+    def slow_build():
+        release.wait(10)
+        return _InstantCorrector()
+
+    monkeypatch.setattr(spell_corrector, "_corrector", None)
+    monkeypatch.setattr(spell_corrector, "_build_thread", None)
+    monkeypatch.setattr(spell_corrector, "_build_corrector", slow_build)
+    spell_corrector.correct_token.cache_clear()
+    try:
+        started = time.perf_counter()
+        assert spell_corrector.correct_text("marathn") == "marathn"
+        assert spell_corrector.correct_text("marathn") == "marathn"  # build still running
+        assert time.perf_counter() - started < 0.5
+
+        release.set()
+        spell_corrector._build_thread.join(5)
+        assert spell_corrector.correct_text("marathn") == "marathon"
+    finally:
+        release.set()
+        spell_corrector.correct_token.cache_clear()